@@ -0,0 +1,34 @@
+'''
+导入耗时基准测试
+在新进程中导入utaufile及utaufile.plugin，导入了numpy或耗时超过上限时返回非0
+用法：python benchmark/importtime.py [上限毫秒数，默认100]
+'''
+import os
+import sys
+import subprocess
+
+code='''
+import sys,time
+t=time.perf_counter()
+import utaufile,utaufile.plugin
+print((time.perf_counter()-t)*1000,"numpy" in sys.modules)
+'''
+
+def main():
+    limit=float(sys.argv[1]) if len(sys.argv)>1 else 100.0
+    root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env=dict(os.environ,PYTHONPATH=root)
+    #取多次运行的最小值，减少磁盘缓存等因素的干扰
+    results=[]
+    for i in range(5):
+        out=subprocess.run([sys.executable,"-c",code],env=env,check=True,
+                           stdout=subprocess.PIPE,universal_newlines=True).stdout.split()
+        results.append((float(out[0]),out[1]=="True"))
+    ms=min(i[0] for i in results)
+    numpy=any(i[1] for i in results)
+    print("import utaufile: {:.1f} ms, numpy imported: {}".format(ms,numpy))
+    if(numpy or ms>limit):
+        sys.exit(1)
+
+if(__name__=="__main__"):
+    main()
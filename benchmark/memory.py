@@ -0,0 +1,69 @@
+'''
+内存占用基准测试
+生成一个ust文件和一个nn文件，用tracemalloc统计打开后每个音符占用的字节数
+只使用openust()、opennn()，可在不同版本上分别运行以比较
+用法：python benchmark/memory.py [音符数，默认20000]
+'''
+import os
+import sys
+import gc
+import random
+import tempfile
+import tracemalloc
+
+root=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0,root)
+import utaufile
+
+def makeust(filename:str,n:int):
+    r=random.Random(0)
+    lines=["[#VERSION]","UST Version1.2","Charset=UTF-8","[#SETTING]","Tempo=120.00","Tracks=1"]
+    for i in range(n):
+        lines+=["[#{:0>4}]".format(i),
+                "Length={}".format(r.choice([120,240,480,960])),
+                "Lyric="+r.choice(["あ","か","さ","た","R"]),
+                "NoteNum={}".format(r.randint(55,75)),
+                "PreUtterance=",
+                "Intensity=100",
+                "Modulation=0",
+                "Flags="+r.choice(["","g-5","B30H10"]),
+                "PBS=-40;0",
+                "PBW=80",
+                "PBY=0",
+                "Envelope=0,5,35,0,100,100,0",
+                "VBR=65,180,35,20,20,0,0,0"]
+    lines.append("[#TRACKEND]")
+    with open(filename,"w",encoding="utf8",newline="\r\n") as file:
+        file.write("\n".join(lines)+"\n")
+
+def makenn(filename:str,n:int):
+    r=random.Random(0)
+    lines=["120.0 4 4 {} 19 0 0 0 0 0".format(n//4+1),str(n)]
+    for i in range(n):
+        dyn=",".join(["100"]+[str(r.randint(0,100)) for j in range(100)])
+        pit=",".join(["100"]+[str(r.randint(0,100)) for j in range(100)])
+        lines.append(" 啊 a {} 8 23 50 50 0 0 0 0 {} {} 0".format(i*8,dyn,pit))
+    with open(filename,"w",encoding="utf8") as file:
+        file.write("\n".join(lines)+"\n")
+
+def measure(function,n:int)->float:
+    gc.collect()
+    tracemalloc.start()
+    result=function()
+    size=tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del result
+    return size/n
+
+def main():
+    n=int(sys.argv[1]) if len(sys.argv)>1 else 20000
+    with tempfile.TemporaryDirectory() as directory:
+        ust=os.path.join(directory,"test.ust")
+        nn=os.path.join(directory,"test.nn")
+        makeust(ust,n)
+        makenn(nn,n)
+        print("Ustnote (openust): {:.0f} bytes/note".format(measure(lambda:utaufile.openust(ust),n)))
+        print("Nnnote (opennn): {:.0f} bytes/note".format(measure(lambda:utaufile.opennn(nn),n)))
+
+if(__name__=="__main__"):
+    main()
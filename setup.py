@@ -19,7 +19,7 @@ DESCRIPTION = 'Read and write UTAU ust file and NiaoNIAO nn file'
 URL = 'https://gitee.com/oxygendioxide/utaufile'
 EMAIL = '1463567152@qq.com'    
 AUTHOR = 'oxygen dioxide'
-REQUIRES_PYTHON = '>=3.5.0' 
+REQUIRES_PYTHON = '>=3.8.0' 
 VERSION = '0.1.0'
     
 REQUIRED = ["numpy"]    
@@ -105,9 +105,9 @@ setup(
     # If your package is a single module, use this instead of 'packages':
     # py_modules=['mypackage'],
 
-    # entry_points={
-    #     'console_scripts': ['mycli=mymodule:cli'],
-    # },
+    entry_points={
+        'console_scripts': ['utaufile=utaufile.convert:main'],
+    },
     install_requires=REQUIRED,
     extras_require=EXTRAS,
     include_package_data=True,
@@ -119,9 +119,6 @@ setup(
         'Programming Language :: Python',
         'Programming Language :: Python :: 3',
         'Programming Language :: Python :: 3.8',
-        'Programming Language :: Python :: 3.7',
-        'Programming Language :: Python :: 3.6',
-        'Programming Language :: Python :: 3.5',
         'Topic :: Multimedia :: Sound/Audio :: MIDI',
         "Topic :: Multimedia :: Sound/Audio :: Sound Synthesis",
         'Programming Language :: Python :: Implementation :: CPython'
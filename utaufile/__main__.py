@@ -0,0 +1,7 @@
+'''
+命令行入口，例：python -m utaufile convert "*.ust" --to nn
+'''
+import sys
+from .convert import main
+
+sys.exit(main())
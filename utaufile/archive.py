@@ -0,0 +1,337 @@
+'''
+utaufile.archive用于把大量ust、nn工程打包为一个列式存档文件，依赖numpy
+存档由定长的列（numpy数组）、字符串表、每个文件的偏移量索引和末尾的JSON目录组成
+读取时使用内存映射，只有被访问的工程、音符才会被读取和恢复
+例：
+    from utaufile import archive
+    archive.savearchive("songs.uar",[u1,u2,n1],names=["a.ust","b.ust","c.nn"])
+    a=archive.openarchive("songs.uar")
+    u=a[1]
+    note=a.note(30517,12)
+'''
+import json
+import struct
+import numpy as np
+from typing import List,Tuple
+from .ust import Ustnote,Ustfile,ustvaluestr,ustvaluetyper,_newustnotes
+from .nn import Nnnote,Nnfile,_stackcurves,_newnnnotes
+
+_magic=b"UTAUARC1"
+_version=1
+#文件末尾：JSON目录长度（8字节，小端）+_magic
+_trailer=struct.Struct("<Q8s")
+
+#nn音符的整数列，顺序与Nnnote的参数相同
+_nncolumns=("start","length","notenum","cle","vel","por","viblen","vibdep","vibrat","pbs")
+
+class _Strings():
+    '''
+    写入存档时使用的字符串表，每种字符串只保存一次
+    '''
+    def __init__(self):
+        self.ids={}
+
+    def __call__(self,s:str)->int:
+        i=self.ids.get(s)
+        if(i is None):
+            i=self.ids[s]=len(self.ids)
+        return i
+
+    def columns(self):
+        '''
+        返回(偏移量数组,UTF-8数据)，第i个字符串为data[offset[i]:offset[i+1]]
+        '''
+        data=[s.encode("utf-8","surrogateescape") for s in self.ids]
+        offset=np.zeros(len(data)+1,dtype=np.int64)
+        np.cumsum([len(b) for b in data],out=offset[1:])
+        return (offset,np.frombuffer(b"".join(data),dtype=np.uint8))
+
+def _fileproperties(properties:dict)->dict:
+    '''
+    将工程整体属性转换为可保存为JSON的字典
+    以"_"开头的临时变量如果无法保存为JSON则被忽略
+    '''
+    result={}
+    for (key,value) in properties.items():
+        if(key.startswith("_")):
+            try:
+                json.dumps(value)
+            except (TypeError,ValueError):
+                continue
+            result[key]=value
+        else:
+            result[key]=ustvaluestr(key,value)
+    return result
+
+def _curvecolumn(curves:list):
+    '''
+    将nn音符的曲线组成矩阵，取值都在int16范围内时以int16保存，否则以int64保存
+    '''
+    return _narrowcurve(_stackcurves(curves))
+
+def _narrowcurve(matrix):
+    '''
+    曲线矩阵的取值都在int16范围内时转换为int16，否则转换为int64
+    '''
+    if(matrix.size==0 or (matrix.min()>=-32768 and matrix.max()<=32767)):
+        return matrix.astype(np.int16,copy=False)
+    return matrix.astype(np.int64,copy=False)
+
+def _archivecolumns(files:list,names:List[str])->Tuple[dict,List[dict]]:
+    '''
+    将多个Ustfile、Nnfile对象转换为存档的各列，返回(列名:numpy数组的字典,各工程的元数据列表)
+    '''
+    strings=_Strings()
+    ust={"length":[],"notenum":[],"lyric":[],"propcount":[],"propkey":[],"propvalue":[]}
+    nn={"hanzi":[],"pinyin":[],"ints":[],"dyn":[],"pit":[]}
+    filekind=[]
+    filefirst=[]
+    filecount=[]
+    meta=[]
+    for (name,f) in zip(names,files):
+        if(isinstance(f,Ustfile)):
+            filekind.append(0)
+            filefirst.append(len(ust["length"]))
+            filecount.append(len(f.note))
+            for note in f.note:
+                ust["length"].append(note.length)
+                ust["notenum"].append(note.notenum)
+                ust["lyric"].append(strings(note.lyric))
+                properties=note._getproperties()
+                ust["propcount"].append(len(properties))
+                for (key,value) in properties.items():
+                    ust["propkey"].append(strings(key))
+                    ust["propvalue"].append(strings(ustvaluestr(key,value)))
+            meta.append({"name":name,"tempo":f.tempo,"properties":_fileproperties(f.properties)})
+        elif(isinstance(f,Nnfile)):
+            filekind.append(1)
+            filefirst.append(len(nn["hanzi"]))
+            filecount.append(len(f.note))
+            for note in f.note:
+                nn["hanzi"].append(strings(note.hanzi))
+                nn["pinyin"].append(strings(note.pinyin))
+                nn["ints"].append([getattr(note,i) for i in _nncolumns])
+                nn["dyn"].append(note._dyn)
+                nn["pit"].append(note._pit)
+            meta.append({"name":name,"tempo":f.tempo,"beats":list(f.beats)})
+        else:
+            raise TypeError("unsupported file type: {}".format(type(f).__name__))
+    (stringoffset,stringdata)=strings.columns()
+    propoffset=np.zeros(len(ust["propcount"])+1,dtype=np.int64)
+    np.cumsum(ust["propcount"],out=propoffset[1:])
+    columns={"filekind":np.array(filekind,dtype=np.uint8),
+             "filefirst":np.array(filefirst,dtype=np.int64),
+             "filecount":np.array(filecount,dtype=np.int64),
+             "stringoffset":stringoffset,
+             "stringdata":stringdata,
+             "ustlength":np.array(ust["length"],dtype=np.int64),
+             "ustnotenum":np.array(ust["notenum"],dtype=np.int64),
+             "ustlyric":np.array(ust["lyric"],dtype=np.int32),
+             "ustpropoffset":propoffset,
+             "ustpropkey":np.array(ust["propkey"],dtype=np.int32),
+             "ustpropvalue":np.array(ust["propvalue"],dtype=np.int32),
+             "nnhanzi":np.array(nn["hanzi"],dtype=np.int32),
+             "nnpinyin":np.array(nn["pinyin"],dtype=np.int32),
+             "nnints":np.array(nn["ints"],dtype=np.int64).reshape(-1,len(_nncolumns)),
+             "nndyn":_curvecolumn(nn["dyn"]),
+             "nnpit":_curvecolumn(nn["pit"])}
+    return (columns,meta)
+
+def savearchive(filename:str,files:list,names:List[str]=None):
+    '''
+    将多个Ustfile、Nnfile对象保存为一个存档文件
+    files：Ustfile、Nnfile对象的列表
+    names：各工程的名称（例如原文件名），默认为序号
+    音符properties的值以ust中的字符串形式保存，读取时用ustvaluetyper()恢复类型
+    '''
+    if(names is None):
+        names=[str(i) for i in range(len(files))]
+    (columns,meta)=_archivecolumns(files,names)
+    directory={"version":_version,"columns":{},"files":meta}
+    with open(filename,"wb") as file:
+        file.write(_magic)
+        for (name,array) in columns.items():
+            #每列按8字节对齐
+            file.write(b"\0"*(-file.tell()%8))
+            directory["columns"][name]=[file.tell(),array.dtype.str,list(array.shape)]
+            file.write(np.ascontiguousarray(array).tobytes())
+        footer=json.dumps(directory,ensure_ascii=False).encode("utf-8")
+        file.write(footer)
+        file.write(_trailer.pack(len(footer),_magic))
+
+class Archive():
+    '''
+    存档文件类，由openarchive()生成
+    names:各工程的名称，list
+    kinds:各工程的类型，"ust"或"nn"，list
+    a[i]返回第i个工程（Ustfile或Nnfile对象），每次调用都从存档中重新恢复
+    '''
+    def __init__(self,filename:str):
+        self.filename:str=filename
+        #以普通ndarray访问内存映射，切片时不必经过np.memmap的子类开销
+        self._map=np.memmap(filename,dtype=np.uint8,mode="r").view(np.ndarray)
+        (footerlength,magic)=_trailer.unpack(self._map[-_trailer.size:].tobytes())
+        if(magic!=_magic or self._map[:len(_magic)].tobytes()!=_magic):
+            raise ValueError("not a utaufile archive: {}".format(filename))
+        end=len(self._map)-_trailer.size
+        directory=json.loads(self._map[end-footerlength:end].tobytes().decode("utf-8"))
+        if(directory["version"]!=_version):
+            raise ValueError("unsupported archive version: {}".format(directory["version"]))
+        columns={}
+        for (name,(offset,dtype,shape)) in directory["columns"].items():
+            dtype=np.dtype(dtype)
+            count=int(np.prod(shape))
+            columns[name]=self._map[offset:offset+count*dtype.itemsize].view(dtype).reshape(shape)
+        self._setcolumns(columns,directory["files"])
+
+    @classmethod
+    def _fromcolumns(cls,columns:dict,meta:List[dict]):
+        '''
+        由_archivecolumns()生成的各列直接创建存档对象，不对应任何文件（供utaufile.cache使用）
+        '''
+        self=cls.__new__(cls)
+        self.filename=None
+        self._map=None
+        self._setcolumns(columns,meta)
+        return self
+
+    def _setcolumns(self,columns:dict,meta:List[dict]):
+        self._columns:dict=columns
+        self._meta:List[dict]=meta
+        self.names:List[str]=[i["name"] for i in self._meta]
+        self.kinds:List[str]=[("ust","nn")[i] for i in self._columns["filekind"].tolist()]
+        self._strings={}
+        #(键序号,值序号)组合为一个整数:(键,值)
+        self._values={}
+
+    def __len__(self):
+        return len(self._meta)
+
+    def __getitem__(self,i:int):
+        if(i<0):
+            i+=len(self)
+        c=self._columns
+        first=int(c["filefirst"][i])
+        count=int(c["filecount"][i])
+        meta=self._meta[i]
+        if(self.kinds[i]=="ust"):
+            properties={}
+            for (key,value) in meta["properties"].items():
+                properties[key]=value if key.startswith("_") else ustvaluetyper(key,value)
+            return Ustfile(note=self._ustnotes(first,first+count),
+                           tempo=meta["tempo"],
+                           properties=properties)
+        return Nnfile(tempo=meta["tempo"],
+                      beats=tuple(meta["beats"]),
+                      note=self._nnnotes(first,first+count))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self,*args):
+        self.close()
+
+    def close(self):
+        '''
+        关闭内存映射
+        '''
+        self._columns={}
+        self._map=None
+
+    def _string(self,i:int)->str:
+        s=self._strings.get(i)
+        if(s is None):
+            offset=self._columns["stringoffset"]
+            data=self._columns["stringdata"][int(offset[i]):int(offset[i+1])]
+            s=self._strings[i]=data.tobytes().decode("utf-8","surrogateescape")
+        return s
+
+    def _stringlist(self,ids)->List[str]:
+        '''
+        由字符串表序号数组恢复字符串列表
+        '''
+        strings=self._strings
+        string=self._string
+        return [strings[i] if i in strings else string(i) for i in ids.tolist()]
+
+    def _value(self,pair:int)->tuple:
+        '''
+        由组合后的字符串表序号恢复(键,值)，不可变的值在各音符间共享，只解析一次
+        '''
+        (key,value)=divmod(pair,len(self._columns["stringoffset"]))
+        k=self._string(key)
+        item=(k,ustvaluetyper(k,self._string(value)))
+        if(type(item[1]) in (tuple,str,int,float)):
+            self._values[pair]=item
+        return item
+
+    def _ustnotes(self,start:int,end:int)->List[Ustnote]:
+        c=self._columns
+        values=self._values
+        value_of=self._value
+        propoffset=c["ustpropoffset"][start:end+1]
+        base=int(propoffset[0])
+        keys=c["ustpropkey"][base:int(propoffset[-1])].astype(np.int64)
+        pairs=keys*len(c["stringoffset"])+c["ustpropvalue"][base:int(propoffset[-1])]
+        data=pairs.tobytes()
+        bounds=((propoffset-base)*pairs.itemsize).tolist()
+        #properties完全相同的音符只解码一次，之后复制字典，含可变值的音符每次重新解码
+        rows={}
+        properties=[]
+        for (a,b) in zip(bounds[:-1],bounds[1:]):
+            row=data[a:b]
+            p=rows.get(row)
+            if(p is None):
+                ids=np.frombuffer(row,dtype=np.int64).tolist()
+                p=dict(values[i] if i in values else value_of(i) for i in ids)
+                if(all(i in values for i in ids)):
+                    rows[row]=p
+                    p=p.copy()
+            else:
+                p=p.copy()
+            properties.append(p)
+        return _newustnotes(zip(c["ustlength"][start:end].tolist(),
+                                self._stringlist(c["ustlyric"][start:end]),
+                                c["ustnotenum"][start:end].tolist(),
+                                properties))
+
+    def _nnnotes(self,start:int,end:int)->List[Nnnote]:
+        c=self._columns
+        ints=c["nnints"][start:end].T.tolist()
+        #各音符共享只读的曲线矩阵，第一次访问dyn、pit时才复制
+        dyn=c["nndyn"][start:end].astype(np.int64,copy=False)
+        pit=c["nnpit"][start:end].astype(np.int64,copy=False)
+        dyn.flags.writeable=False
+        pit.flags.writeable=False
+        return _newnnnotes(zip(self._stringlist(c["nnhanzi"][start:end]),
+                               self._stringlist(c["nnpinyin"][start:end]),
+                               *ints[:-1],
+                               dyn,
+                               pit,
+                               ints[-1]))
+
+    def notecount(self,i:int)->int:
+        '''
+        获取第i个工程的音符数
+        '''
+        return int(self._columns["filecount"][i])
+
+    def note(self,i:int,j:int):
+        '''
+        只读取第i个工程的第j个音符，返回Ustnote或Nnnote对象
+        '''
+        count=self.notecount(i)
+        if(j<0):
+            j+=count
+        if(not 0<=j<count):
+            raise IndexError("note index out of range")
+        first=int(self._columns["filefirst"][i])+j
+        if(self.kinds[i]=="ust"):
+            return self._ustnotes(first,first+1)[0]
+        return self._nnnotes(first,first+1)[0]
+
+def openarchive(filename:str)->Archive:
+    '''
+    打开存档文件，返回Archive对象
+    '''
+    return Archive(filename)
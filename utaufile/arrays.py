@@ -0,0 +1,192 @@
+'''
+utaufile.arrays包括ust、nn工程的列式表示，依赖numpy
+'''
+import numpy as np
+from typing import Tuple,List
+from .ust import Ustnote,Ustfile
+from .nn import Nnnote,Nnfile,_getpitbend,_setpitbend
+
+class UstArrays():
+    '''
+    ust工程的列式表示，每个音符占各数组中的一行，由Ustfile.to_arrays()生成
+    length:时长，numpy.ndarray
+    notenum:音高，numpy.ndarray
+    start:音符起点（相对工程开头，480为一拍），numpy.ndarray
+    rest:是否为休止符，bool类型的numpy.ndarray
+    lyric:歌词在lyrics中的序号，numpy.ndarray
+    lyrics:歌词表，每种歌词只保存一次，list
+    properties:每个音符的其他数据，dict的列表
+    tempo:曲速，float
+    fileproperties:工程整体属性(即[#SETTING]块),dict
+    '''
+    def __init__(self,length,notenum,lyric,lyrics:List[str],
+                 properties:List[dict]=None,
+                 tempo:float=120,
+                 fileproperties:dict=None):
+        self.length=np.asarray(length,dtype=np.int64)
+        self.notenum=np.asarray(notenum,dtype=np.int64)
+        self.lyric=np.asarray(lyric,dtype=np.int64)
+        self.lyrics:List[str]=lyrics
+        if(properties is None):
+            properties=[{} for i in range(len(self.length))]
+        if(fileproperties is None):
+            fileproperties={}
+        self.properties:List[dict]=properties
+        self.tempo:float=tempo
+        self.fileproperties:dict=fileproperties
+        self.update()
+
+    def update(self):
+        '''
+        根据length与lyric重新计算start与rest，直接修改这两个数组后需要调用
+        '''
+        self.start=np.cumsum(self.length)-self.length
+        restlyric=np.array([i in [""," ","r","R"] for i in self.lyrics],dtype=bool)
+        self.rest=restlyric[self.lyric]
+        return self
+
+    def __len__(self):
+        return len(self.length)
+
+    def getlyric(self)->list:
+        '''
+        获取所有音符的歌词，返回歌词列表
+        '''
+        return [self.lyrics[i] for i in self.lyric.tolist()]
+
+    def totallength(self)->int:
+        '''
+        获取ust工程的总长度
+        '''
+        return int(self.length.sum())
+
+    def nrange(self)->tuple:
+        '''
+        获取ust工程的音域
+        返回元组：(最低音,最高音+1)
+        '''
+        notenums=self.notenum[~self.rest]
+        return (int(notenums.min()),int(notenums.max())+1)
+
+    def transpose(self,n:int):
+        """
+        对utau工程移调
+        n：移调半音数，向上为正，向下为负。
+        """
+        self.notenum+=n
+        return self
+
+    def quantize(self,d:int):
+        '''
+        将UST工程按照给定的分度值（四分音符为480）量化。
+        将所有音符的边界四舍五入到d的整数倍，过短的音符将被删除。
+        与Ustfile.quantize()相同，每个音符的终点由量化后的起点加上时长再四舍五入得到
+        '''
+        (q,r)=np.divmod(self.length,d)
+        #每个音符使量化后的终点前进的分度数
+        step=q+(2*r>d)
+        tie=np.flatnonzero(2*r==d)
+        if(len(tie)):
+            #恰好位于两个分度正中的终点与round()一样舍入到偶数，取决于之前的量化结果，逐个计算
+            before=np.cumsum(step)
+            carry=0
+            for i in tie.tolist():
+                if((before[i]+carry)%2):
+                    step[i]+=1
+                    carry+=1
+        qend=np.cumsum(step)*d
+        length=np.diff(qend,prepend=0)
+        qstart=qend-length
+        keep=np.flatnonzero(length>0)
+        self.length=length[keep]
+        self.notenum=self.notenum[keep]
+        self.lyric=self.lyric[keep]
+        self.properties=[self.properties[i] for i in keep.tolist()]
+        self.start=qstart[keep]
+        self.rest=self.rest[keep]
+        return self
+
+    def to_ust_file(self):
+        '''
+        将列式表示转换回ust文件对象
+        '''
+        lyrics=self.lyrics
+        note=[Ustnote(length=length,
+                      lyric=lyrics[lyric],
+                      notenum=notenum,
+                      properties=properties.copy())
+              for (length,lyric,notenum,properties) in zip(self.length.tolist(),
+                                                            self.lyric.tolist(),
+                                                            self.notenum.tolist(),
+                                                            self.properties)]
+        return Ustfile(note=note,
+                       tempo=self.tempo,
+                       properties=self.fileproperties.copy())
+
+class NnArrays():
+    '''
+    nn工程的列式表示，每个音符占各数组中的一行，由Nnfile.to_arrays()生成
+    hanzi,pinyin:歌词，list
+    start,length,notenum,cle,vel,por,viblen,vibdep,vibrat,pbs:含义同Nnnote，numpy.ndarray
+    dyn,pit:曲线矩阵，每行为一个音符，numpy.ndarray
+    tempo:曲速，float
+    beats:节拍，元组
+    '''
+    def __init__(self,hanzi:List[str],pinyin:List[str],start,length,notenum,
+                 cle,vel,por,viblen,vibdep,vibrat,dyn,pit,pbs,
+                 tempo:float=120.0,
+                 beats:Tuple[int,int]=(4,4)):
+        self.hanzi:List[str]=hanzi
+        self.pinyin:List[str]=pinyin
+        self.start=np.asarray(start,dtype=np.int64)
+        self.length=np.asarray(length,dtype=np.int64)
+        self.notenum=np.asarray(notenum,dtype=np.int64)
+        self.cle=np.asarray(cle,dtype=np.int64)
+        self.vel=np.asarray(vel,dtype=np.int64)
+        self.por=np.asarray(por,dtype=np.int64)
+        self.viblen=np.asarray(viblen,dtype=np.int64)
+        self.vibdep=np.asarray(vibdep,dtype=np.int64)
+        self.vibrat=np.asarray(vibrat,dtype=np.int64)
+        self.dyn=np.asarray(dyn)
+        self.pit=np.asarray(pit)
+        self.pbs=np.asarray(pbs,dtype=np.int64)
+        self.tempo:float=tempo
+        self.beats:Tuple[int,int]=beats
+
+    def __len__(self):
+        return len(self.start)
+
+    def transpose(self,n:int):
+        """
+        对nn工程移调
+        n：移调半音数，向上为正，向下为负。
+        """
+        self.notenum+=n
+        return self
+
+    def get_pitbend_matrix(self):
+        '''
+        获得所有音符的pit参数对音符的作用量（pit*pbs），单位为半音，返回矩阵，每行为一个音符
+        '''
+        return _getpitbend(self.pit,self.pbs)
+
+    def set_pitbend_matrix(self,pitbend):
+        '''
+        设置所有音符的pit参数对音符的作用量（pit*pbs），单位为半音
+        pitbend：矩阵，每行为一个音符，每个音符的pbs由该行的最大偏移量决定
+        '''
+        (self.pit,self.pbs)=_setpitbend(pitbend)
+        return self
+
+    def to_nn_file(self):
+        '''
+        将列式表示转换回nn文件对象，各音符的dyn、pit为矩阵中的一行
+        '''
+        columns=zip(self.hanzi,self.pinyin,
+                    self.start.tolist(),self.length.tolist(),self.notenum.tolist(),
+                    self.cle.tolist(),self.vel.tolist(),self.por.tolist(),
+                    self.viblen.tolist(),self.vibdep.tolist(),self.vibrat.tolist(),
+                    self.dyn,self.pit,self.pbs.tolist())
+        return Nnfile(tempo=self.tempo,
+                      beats=self.beats,
+                      note=[Nnnote(*i) for i in columns])
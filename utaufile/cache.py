@@ -0,0 +1,281 @@
+'''
+utaufile.cache用于缓存解析后的ust、nn工程，反复打开同一文件时不必重新解析文本
+缓存分两层：
+    磁盘缓存：每个文件一个.npz缓存文件，保存与utaufile.archive相同的列与字符串表，读取时不使用pickle
+    内存缓存：按最近使用顺序保存已解码的各列（ust工程还保存音符模板），总大小不超过memorylimit
+缓存以文件的绝对路径为键，文件大小、修改时间改变时用内容哈希判断文件是否真的被修改
+每次读取都返回新的对象，修改返回的对象不会影响缓存
+例：
+    from utaufile import cache
+    u=cache.openust("song.ust")
+    n=cache.opennn("song.nn")
+'''
+import gc
+import os
+import re
+import sys
+import copy
+import json
+import hashlib
+import contextlib
+import collections
+from typing import Tuple
+
+#缓存格式版本，格式改变时旧的缓存自动失效
+_version=2
+#磁盘缓存文件名：文件路径的sha1.类型.npz
+_cachename=re.compile(r"[0-9a-f]{40}\.(ust|nn)\.npz")
+
+def _defaultdirectory()->str:
+    base=os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"),".cache")
+    return os.path.join(base,"utaufile")
+
+def _hashfile(filename:str)->bytes:
+    h=hashlib.blake2b(digest_size=16)
+    with open(filename,"rb") as f:
+        for chunk in iter(lambda:f.read(1<<20),b""):
+            h.update(chunk)
+    return h.digest()
+
+@contextlib.contextmanager
+def _nogc():
+    '''
+    恢复大量小对象时暂停垃圾回收，避免反复扫描刚创建的对象
+    '''
+    enabled=gc.isenabled()
+    gc.disable()
+    try:
+        yield
+    finally:
+        if(enabled):
+            gc.enable()
+
+def _openust(filename:str):
+    from .ust import openust
+    return openust(filename)
+
+def _opennn(filename:str):
+    from .nn import opennn
+    return opennn(filename)
+
+#文件类型:打开函数
+_kinds={"ust":_openust,"nn":_opennn}
+
+class _Entry():
+    '''
+    一个文件的缓存：stamp为(文件大小,修改时间)，digest为内容哈希，archive为只含该工程的存档对象
+    template为内存缓存中ust工程的音符模板，读取时只需复制各音符的properties字典
+    '''
+    __slots__=("stamp","digest","archive","size","template")
+
+    def __init__(self,stamp:Tuple[int,int],digest:bytes,archive):
+        self.stamp=stamp
+        self.digest=digest
+        self.archive=archive
+        self.size=sum(i.nbytes for i in archive._columns.values())
+        self.template=None
+
+    def prepare(self):
+        '''
+        放入内存缓存时生成音符模板，音符properties中有可变的值时不生成，每次从各列恢复
+        '''
+        if(self.template is not None or self.archive.kinds[0]!="ust"):
+            return
+        f=self.archive[0]
+        noteproperties=[i._properties for i in f.note]
+        if(not all(type(v) in (tuple,str,int,float,bool) for p in noteproperties for v in p.values())):
+            return
+        self.template=(f.tempo,
+                       f.properties,
+                       [i._length for i in f.note],
+                       [i._lyric for i in f.note],
+                       [i._notenum for i in f.note],
+                       noteproperties)
+        self.size+=sum(sys.getsizeof(p) for p in noteproperties)
+
+    def restore(self):
+        '''
+        恢复工程，返回新的Ustfile或Nnfile对象
+        '''
+        if(self.template is None):
+            return self.archive[0]
+        from .ust import Ustfile,_newustnotes
+        (tempo,properties,length,lyric,notenum,noteproperties)=self.template
+        return Ustfile(note=_newustnotes(zip(length,lyric,notenum,[p.copy() for p in noteproperties])),
+                       tempo=tempo,
+                       properties=copy.deepcopy(properties))
+
+class Cache():
+    '''
+    解析结果缓存
+    directory：磁盘缓存文件夹，默认为~/.cache/utaufile，为None时不使用磁盘缓存
+    memorylimit：内存缓存的总字节数上限，为0时不使用内存缓存
+    '''
+    def __init__(self,directory:str="",memorylimit:int=64<<20):
+        if(directory==""):
+            directory=_defaultdirectory()
+        self.directory:str=directory
+        self.memorylimit:int=memorylimit
+        self.memorysize:int=0
+        #(类型,绝对路径):_Entry
+        self._memory=collections.OrderedDict()
+
+    def _path(self,kind:str,filename:str)->str:
+        name=hashlib.sha1(filename.encode("utf-8","surrogateescape")).hexdigest()
+        return os.path.join(self.directory,"{}.{}.npz".format(name,kind))
+
+    def _remember(self,key:tuple,entry:_Entry):
+        '''
+        将已解码的缓存放入内存缓存，超过上限时淘汰最久未使用的条目
+        '''
+        old=self._memory.pop(key,None)
+        if(old is not None):
+            self.memorysize-=old.size
+        entry.prepare()
+        if(entry.size>self.memorylimit):
+            return
+        self._memory[key]=entry
+        self.memorysize+=entry.size
+        while(self.memorysize>self.memorylimit):
+            self.memorysize-=self._memory.popitem(last=False)[1].size
+
+    def _store(self,path:str,entry:_Entry):
+        '''
+        写入磁盘缓存，先写临时文件再替换，无法写入时忽略
+        '''
+        import numpy as np
+        archive=entry.archive
+        meta=json.dumps(archive._meta,ensure_ascii=False).encode("utf-8")
+        try:
+            os.makedirs(self.directory,exist_ok=True)
+            temp="{}.{}.tmp".format(path,os.getpid())
+            with open(temp,"wb") as f:
+                np.savez(f,
+                         _header=np.array((_version,)+entry.stamp,dtype=np.int64),
+                         _digest=np.frombuffer(entry.digest,dtype=np.uint8),
+                         _meta=np.frombuffer(meta,dtype=np.uint8),
+                         **archive._columns)
+            os.replace(temp,path)
+        except OSError:
+            pass
+
+    def _read(self,path:str)->_Entry:
+        '''
+        读取磁盘缓存，文件不存在、损坏或版本不同时返回None
+        '''
+        import numpy as np
+        from .archive import Archive
+        try:
+            with np.load(path,allow_pickle=False) as z:
+                columns={name:z[name] for name in z.files}
+            header=columns.pop("_header").tolist()
+            digest=columns.pop("_digest").tobytes()
+            meta=json.loads(columns.pop("_meta").tobytes().decode("utf-8"))
+        except Exception:
+            return None
+        if(header[0]!=_version):
+            return None
+        try:
+            archive=Archive._fromcolumns(columns,meta)
+        except Exception:
+            return None
+        return _Entry((header[1],header[2]),digest,archive)
+
+    def _lookup(self,kind:str,filename:str,stamp:Tuple[int,int])->_Entry:
+        '''
+        查找缓存，没有有效缓存时返回None
+        '''
+        key=(kind,filename)
+        entry=self._memory.get(key)
+        fromdisk=False
+        if(entry is None and self.directory is not None):
+            entry=self._read(self._path(kind,filename))
+            fromdisk=True
+        if(entry is None):
+            return None
+        if(entry.stamp!=stamp):
+            #修改时间改变（例如复制、touch）但内容未变时，缓存仍然有效
+            if(entry.stamp[0]!=stamp[0] or _hashfile(filename)!=entry.digest):
+                return None
+            entry.stamp=stamp
+            if(self.directory is not None):
+                self._store(self._path(kind,filename),entry)
+        elif(not fromdisk):
+            self._memory.move_to_end(key)
+            return entry
+        if(self.memorylimit>0):
+            self._remember(key,entry)
+        return entry
+
+    def open(self,kind:str,filename:str):
+        '''
+        打开文件，有有效缓存时从缓存恢复，否则解析文件并写入缓存
+        kind："ust"或"nn"
+        '''
+        opener=_kinds[kind]
+        filename=os.path.abspath(filename)
+        st=os.stat(filename)
+        stamp=(st.st_size,st.st_mtime_ns)
+        with _nogc():
+            entry=self._lookup(kind,filename,stamp)
+            if(entry is not None):
+                return entry.restore()
+        f=opener(filename)
+        if(self.directory is None and self.memorylimit<=0):
+            return f
+        from .archive import Archive,_archivecolumns
+        entry=_Entry(stamp,_hashfile(filename),Archive._fromcolumns(*_archivecolumns([f],[filename])))
+        if(self.directory is not None):
+            self._store(self._path(kind,filename),entry)
+        if(self.memorylimit>0):
+            self._remember((kind,filename),entry)
+        return f
+
+    def openust(self,filename:str):
+        '''
+        打开ust文件，返回Ustfile对象
+        '''
+        return self.open("ust",filename)
+
+    def opennn(self,filename:str):
+        '''
+        打开nn文件，返回Nnfile对象
+        '''
+        return self.open("nn",filename)
+
+    def clear(self,disk:bool=False):
+        '''
+        清空内存缓存
+        disk：如果为True，同时删除磁盘缓存文件，缓存文件夹中的其他文件不会被删除
+        '''
+        self._memory.clear()
+        self.memorysize=0
+        if(disk and self.directory is not None and os.path.isdir(self.directory)):
+            for name in os.listdir(self.directory):
+                if(_cachename.fullmatch(name)):
+                    os.remove(os.path.join(self.directory,name))
+
+_default=None
+
+def getcache()->Cache:
+    '''
+    获取openust()、opennn()使用的默认缓存
+    '''
+    global _default
+    if(_default is None):
+        _default=Cache()
+    return _default
+
+def openust(filename:str,cache:Cache=None):
+    '''
+    使用缓存打开ust文件，返回Ustfile对象
+    cache：使用的Cache对象，默认为getcache()
+    '''
+    return (cache or getcache()).openust(filename)
+
+def opennn(filename:str,cache:Cache=None):
+    '''
+    使用缓存打开nn文件，返回Nnfile对象
+    cache：使用的Cache对象，默认为getcache()
+    '''
+    return (cache or getcache()).opennn(filename)
@@ -0,0 +1,197 @@
+'''
+utaufile.convert用于批量转换ust、nn文件，使用多个进程并行转换
+命令行用法：
+    python -m utaufile convert "songs/**/*.ust" --to nn mid
+    utaufile convert "*.nn" --to ust --outdir out --jobs 8
+比输入文件新的输出文件会被跳过，使用--force强制重新转换
+'''
+import os
+import sys
+import glob
+import argparse
+import concurrent.futures
+from typing import List,Tuple
+
+#输出格式:扩展名
+formats={"ust":".ust",
+         "nn":".nn",
+         "mid":".mid",
+         "dv":".dv"}
+
+def _convertfile(filename:str,targets:List[Tuple[str,str]]):
+    '''
+    转换一个文件
+    targets：由(输出格式,输出文件名)组成的列表
+    '''
+    ext=os.path.splitext(filename)[1].lower()
+    if(ext==".ust"):
+        from .ust import openust
+        f=openust(filename,lazy=True)
+    elif(ext==".nn"):
+        from .nn import opennn
+        f=opennn(filename)
+    else:
+        raise ValueError("unsupported input file type: {}".format(ext))
+    for (fmt,output) in targets:
+        #先写入临时文件，转换失败时不留下不完整的输出文件
+        temp=output+".part"
+        directory=os.path.dirname(output)
+        if(directory!=""):
+            os.makedirs(directory,exist_ok=True)
+        try:
+            if(fmt=="ust"):
+                f.to_ust_file().save(temp)
+            elif(fmt=="nn"):
+                f.to_nn_file().save(temp)
+            elif(fmt=="mid"):
+                f.to_midi_file(temp)
+            elif(fmt=="dv"):
+                f.to_dv_file().save(temp)
+            os.replace(temp,output)
+        finally:
+            if(os.path.exists(temp)):
+                os.remove(temp)
+
+def _convertchunk(jobs:List[Tuple[str,List[Tuple[str,str]]]])->List[Tuple[str,str]]:
+    '''
+    在工作进程中转换一批文件，返回由(文件名,错误信息)组成的列表，转换成功时错误信息为None
+    '''
+    results=[]
+    for (filename,targets) in jobs:
+        try:
+            _convertfile(filename,targets)
+            results.append((filename,None))
+        except Exception as e:
+            results.append((filename,"{}: {}".format(type(e).__name__,e)))
+    return results
+
+def _expand(patterns:List[str])->List[str]:
+    '''
+    展开通配符（支持**），去除重复的文件
+    '''
+    filenames=[]
+    for pattern in patterns:
+        matches=glob.glob(pattern,recursive=True)
+        if(matches==[] and os.path.exists(pattern)):
+            matches=[pattern]
+        filenames+=sorted(matches)
+    return list(dict.fromkeys(filenames))
+
+def convert(patterns:List[str],
+            to:List[str],
+            outdir:str=None,
+            workers:int=None,
+            chunksize:int=None,
+            force:bool=False,
+            progress=None)->List[Tuple[str,str]]:
+    '''
+    批量转换文件
+    patterns：输入文件名或通配符的列表，例如["songs/**/*.ust"]
+    to：输出格式的列表，可选"ust","nn","mid","dv"，与输入格式相同的输出格式被忽略
+    outdir：输出文件夹，默认与输入文件相同，输出文件保持输入文件相对于所有输入文件共同上级文件夹的路径
+    多个输入文件产生同一个输出文件时，除第一个以外都作为转换失败报告
+    workers：进程数，默认为CPU核数，为1时在当前进程中转换
+    chunksize：每次交给工作进程的文件数，默认根据文件数与进程数决定
+    force：如果为True，即使输出文件比输入文件新也重新转换
+    progress：进度回调函数，参数为(已完成文件数,总文件数,本批结果)
+    返回转换失败的文件，由(文件名,错误信息)组成的列表
+    '''
+    for fmt in to:
+        if(fmt not in formats):
+            raise ValueError("unknown output format: {}".format(fmt))
+    if(workers is None):
+        workers=os.cpu_count() or 1
+    filenames=_expand(patterns)
+    #不覆盖同一批次中的输入文件
+    inputs={os.path.abspath(i) for i in filenames}
+    if(outdir is not None and filenames!=[]):
+        #输出文件在outdir中保持输入文件相对于共同上级文件夹的路径，不同文件夹中的同名文件不会互相覆盖
+        root=os.path.commonpath([os.path.dirname(i) for i in inputs])
+    #输出文件名:产生该输出的输入文件
+    outputs={}
+    jobs=[]
+    conflicts=[]
+    for filename in filenames:
+        (stem,ext)=os.path.splitext(filename)
+        if(outdir is not None):
+            stem=os.path.join(outdir,os.path.relpath(os.path.abspath(stem),root))
+        targets=[]
+        for fmt in to:
+            if(formats[fmt]==ext.lower()):
+                continue
+            output=stem+formats[fmt]
+            if(os.path.abspath(output) in inputs):
+                continue
+            other=outputs.setdefault(os.path.abspath(output),filename)
+            if(other!=filename):
+                #例如a.ust与a.nn都转换为a.mid
+                conflicts.append((filename,"output {} is also produced by {}".format(output,other)))
+                continue
+            if(not force and os.path.exists(output)
+               and os.path.getmtime(output)>=os.path.getmtime(filename)):
+                continue
+            targets.append((fmt,output))
+        if(targets!=[]):
+            jobs.append((filename,targets))
+    if(chunksize is None):
+        chunksize=max(1,min(64,len(jobs)//(workers*4)))
+    chunks=[jobs[i:i+chunksize] for i in range(0,len(jobs),chunksize)]
+    errors=[]
+    done=0
+    total=len(jobs)+len(conflicts)
+    def report(results):
+        nonlocal done
+        done+=len(results)
+        errors.extend([i for i in results if i[1] is not None])
+        if(progress is not None):
+            progress(done,total,results)
+    if(conflicts!=[]):
+        report(conflicts)
+    if(workers==1 or len(chunks)<=1):
+        for chunk in chunks:
+            report(_convertchunk(chunk))
+    else:
+        with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+            futures=[executor.submit(_convertchunk,chunk) for chunk in chunks]
+            for future in concurrent.futures.as_completed(futures):
+                report(future.result())
+    return errors
+
+def main(argv:List[str]=None):
+    '''
+    命令行入口
+    '''
+    parser=argparse.ArgumentParser(prog="utaufile")
+    subparsers=parser.add_subparsers(dest="command")
+    p=subparsers.add_parser("convert",help="convert ust/nn files to other formats")
+    p.add_argument("inputs",nargs="+",help="input files or glob patterns (** is supported)")
+    p.add_argument("--to",nargs="+",required=True,choices=sorted(formats),help="output formats")
+    p.add_argument("--outdir",default=None,help="output directory (default: next to each input)")
+    p.add_argument("-j","--jobs",type=int,default=None,help="number of worker processes (default: CPU count)")
+    p.add_argument("--chunksize",type=int,default=None,help="files per work item")
+    p.add_argument("-f","--force",action="store_true",help="convert even if outputs are newer than inputs")
+    p.add_argument("-q","--quiet",action="store_true",help="do not show progress")
+    args=parser.parse_args(argv)
+    if(args.command!="convert"):
+        parser.print_help()
+        return 2
+
+    def progress(done,total,results):
+        for (filename,error) in results:
+            if(error is not None):
+                print("\nerror: {}: {}".format(filename,error),file=sys.stderr)
+        if(not args.quiet):
+            print("\r[{}/{}]".format(done,total),end="",file=sys.stderr,flush=True)
+
+    errors=convert(args.inputs,args.to,
+                   outdir=args.outdir,
+                   workers=args.jobs,
+                   chunksize=args.chunksize,
+                   force=args.force,
+                   progress=progress)
+    if(not args.quiet):
+        print("",file=sys.stderr)
+    if(errors!=[]):
+        print("{} file(s) failed".format(len(errors)),file=sys.stderr)
+        return 1
+    return 0
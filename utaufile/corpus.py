@@ -0,0 +1,248 @@
+'''
+utaufile.corpus用于从大量ust、nn文件中读取音符，合并为一个列式语料库，依赖numpy
+文件由多个进程并行解析，工作进程把各列写入共享内存，只把共享内存的名称传回主进程，避免pickle大量对象
+例：
+    from utaufile import corpus
+    c=corpus.load(["data/**/*.ust","data/**/*.nn"],workers=8)
+    for (filename,error) in c.errors:
+        print(filename,error)
+    pitch=c.notenum[~c.rest]
+'''
+import os
+import concurrent.futures
+from multiprocessing import shared_memory,resource_tracker
+import numpy as np
+from typing import List,Tuple
+from .archive import _narrowcurve
+
+#列名:数据类型，dyn、pit的取值都在int16范围内时为int16，否则为int64
+_columns=(("notenum",np.int64),
+          ("length",np.int64),
+          ("start",np.int64),
+          ("fileid",np.int64),
+          ("lyric",np.int64),
+          ("curve",np.int64),
+          ("dyn",np.int16),
+          ("pit",np.int16),
+          ("tempo",np.float64))
+
+class Corpus():
+    '''
+    列式语料库，每个音符占各数组中的一行，同一文件的音符连续存放，由load()生成
+    files:成功读取的文件名，list
+    kinds:各文件的类型，"ust"或"nn"，list
+    fileoffset:各文件第一个音符的序号，最后一项为音符总数，numpy.ndarray
+    notenum:音高，numpy.ndarray
+    length:时长（480为一拍，nn文件的时长已换算），numpy.ndarray
+    start:音符起点（相对所在工程开头，480为一拍，nn文件的起点已换算），numpy.ndarray
+    fileid:音符所在文件在files中的序号，numpy.ndarray
+    lyric:歌词在lyrics中的序号，nn文件使用拼音，numpy.ndarray
+    lyrics:歌词表，每种歌词只保存一次，list
+    rest:是否为休止符，bool类型的numpy.ndarray
+    curve:nn音符的dyn、pit曲线在dyn、pit矩阵中的行号，ust音符为-1，numpy.ndarray
+    dyn,pit:nn音符的曲线矩阵，每行为一个nn音符，取值都在int16范围内时为int16类型，否则为int64类型的numpy.ndarray
+    tempo:各文件的曲速，numpy.ndarray
+    errors:读取失败的文件，由(文件名,错误信息)组成的列表
+    '''
+    def __init__(self,files:List[str],kinds:List[str],lyrics:List[str],
+                 notenum,length,start,fileid,lyric,curve,dyn,pit,tempo,
+                 errors:List[Tuple[str,str]]=None):
+        self.files:List[str]=files
+        self.kinds:List[str]=kinds
+        self.lyrics:List[str]=lyrics
+        self.notenum=notenum
+        self.length=length
+        self.start=start
+        self.fileid=fileid
+        self.lyric=lyric
+        self.curve=curve
+        self.dyn=dyn
+        self.pit=pit
+        self.tempo=tempo
+        if(errors is None):
+            errors=[]
+        self.errors:List[Tuple[str,str]]=errors
+        self.fileoffset=np.searchsorted(fileid,np.arange(len(files)+1))
+        restlyric=np.array([i in [""," ","r","R"] for i in lyrics],dtype=bool)
+        self.rest=restlyric[lyric]
+
+    def __len__(self):
+        return len(self.notenum)
+
+    def filenotes(self,fileid:int)->range:
+        '''
+        获取一个文件的音符序号范围
+        '''
+        return range(int(self.fileoffset[fileid]),int(self.fileoffset[fileid+1]))
+
+    def getlyric(self)->list:
+        '''
+        获取所有音符的歌词，返回歌词列表
+        '''
+        return [self.lyrics[i] for i in self.lyric.tolist()]
+
+def _concatenate(parts:dict)->dict:
+    '''
+    将各列的数组分别连接，并转换为_columns中的数据类型
+    dyn、pit超出int16范围时保留为int64，不会溢出
+    '''
+    columns={}
+    for (name,dtype) in _columns:
+        if(parts[name]==[]):
+            columns[name]=np.zeros((0,100) if name in ("dyn","pit") else 0,dtype=dtype)
+        elif(name in ("dyn","pit")):
+            columns[name]=_narrowcurve(np.concatenate(parts[name]).astype(np.int64,copy=False))
+        else:
+            columns[name]=np.concatenate(parts[name]).astype(dtype,copy=False)
+    return columns
+
+def _parsefile(filename:str):
+    '''
+    解析一个文件，返回(类型,曲速,音高,起点,时长,歌词,dyn矩阵,pit矩阵)，起点、时长以480为一拍
+    ust文件的起点由时长累加得到，nn文件的音符之间可能有空隙，使用文件中的起点
+    '''
+    ext=os.path.splitext(filename)[1].lower()
+    if(ext==".ust"):
+        from .ust import openust
+        u=openust(filename,lazy=True)
+        length=np.array([i.length for i in u.note],dtype=np.int64)
+        return ("ust",
+                u.tempo,
+                [i.notenum for i in u.note],
+                np.cumsum(length)-length,
+                length,
+                [i.lyric for i in u.note],
+                None,None)
+    elif(ext==".nn"):
+        from .nn import opennn
+        a=opennn(filename).to_arrays()
+        return ("nn",a.tempo,a.notenum,a.start*60,a.length*60,a.pinyin,a.dyn,a.pit)
+    raise ValueError("unsupported input file type: {}".format(ext))
+
+def _parsechunk(filenames:List[str]):
+    '''
+    解析一批文件，返回(列字典,歌词表,成功读取的文件,文件类型,错误列表)
+    '''
+    lyricid={}
+    files=[]
+    kinds=[]
+    errors=[]
+    parts={name:[] for (name,dtype) in _columns}
+    ncurves=0
+    for filename in filenames:
+        try:
+            (kind,tempo,notenum,start,length,lyric,dyn,pit)=_parsefile(filename)
+        except Exception as e:
+            errors.append((filename,"{}: {}".format(type(e).__name__,e)))
+            continue
+        n=len(notenum)
+        parts["notenum"].append(np.asarray(notenum,dtype=np.int64))
+        parts["length"].append(length)
+        parts["start"].append(start)
+        parts["fileid"].append(np.full(n,len(files),dtype=np.int64))
+        parts["lyric"].append(np.array([lyricid.setdefault(i,len(lyricid)) for i in lyric],dtype=np.int64))
+        if(dyn is None):
+            parts["curve"].append(np.full(n,-1,dtype=np.int64))
+        else:
+            parts["curve"].append(np.arange(ncurves,ncurves+n,dtype=np.int64))
+            parts["dyn"].append(dyn)
+            parts["pit"].append(pit)
+            ncurves+=n
+        parts["tempo"].append([float(tempo)])
+        files.append(filename)
+        kinds.append(kind)
+    return (_concatenate(parts),list(lyricid),files,kinds,errors)
+
+def _loadchunk(filenames:List[str]):
+    '''
+    在工作进程中解析一批文件，将各列写入一块共享内存
+    返回(共享内存名称,列布局,歌词表,成功读取的文件,文件类型,错误列表)，列布局由(列名,形状,数据类型,偏移量)组成
+    '''
+    (columns,lyrics,files,kinds,errors)=_parsechunk(filenames)
+    layout=[]
+    size=0
+    for (name,dtype) in _columns:
+        layout.append((name,columns[name].shape,columns[name].dtype.str,size))
+        size+=columns[name].nbytes
+    #共享内存由主进程读取后释放，工作进程退出时不应自动删除
+    try:
+        shm=shared_memory.SharedMemory(create=True,size=max(size,1),track=False)
+        tracked=False
+    except TypeError:
+        #Python 3.13以前没有track参数，POSIX系统中需要手动取消资源跟踪
+        shm=shared_memory.SharedMemory(create=True,size=max(size,1))
+        tracked=(os.name=="posix")
+    for (name,shape,dtype,offset) in layout:
+        view=np.ndarray(shape,dtype=dtype,buffer=shm.buf,offset=offset)
+        view[...]=columns[name]
+        del view
+    shm.close()
+    if(tracked):
+        resource_tracker.unregister("/"+shm.name,"shared_memory")
+    return (shm.name,layout,lyrics,files,kinds,errors)
+
+def _merge(parts)->Corpus:
+    '''
+    合并各批次的结果，重新编号文件、歌词与曲线
+    parts：由_parsechunk()的返回值组成的列表
+    '''
+    lyricid={}
+    files=[]
+    kinds=[]
+    errors=[]
+    merged={name:[] for (name,dtype) in _columns}
+    ncurves=0
+    for (columns,lyrics,chunkfiles,chunkkinds,chunkerrors) in parts:
+        remap=np.array([lyricid.setdefault(i,len(lyricid)) for i in lyrics],dtype=np.int64)
+        curve=columns["curve"]
+        for (name,dtype) in _columns:
+            merged[name].append(columns[name])
+        merged["fileid"][-1]=columns["fileid"]+len(files)
+        merged["lyric"][-1]=remap[columns["lyric"]]
+        merged["curve"][-1]=np.where(curve<0,curve,curve+ncurves)
+        ncurves+=len(columns["dyn"])
+        files+=chunkfiles
+        kinds+=chunkkinds
+        errors+=chunkerrors
+    return Corpus(files=files,kinds=kinds,lyrics=list(lyricid),errors=errors,**_concatenate(merged))
+
+def _attach(result):
+    '''
+    读取工作进程写入共享内存的各列，复制后释放共享内存
+    '''
+    (name,layout,lyrics,files,kinds,errors)=result
+    shm=shared_memory.SharedMemory(name=name)
+    try:
+        columns={}
+        for (column,shape,dtype,offset) in layout:
+            columns[column]=np.ndarray(shape,dtype=dtype,buffer=shm.buf,offset=offset).copy()
+    finally:
+        shm.close()
+        shm.unlink()
+    return (columns,lyrics,files,kinds,errors)
+
+def load(paths:List[str],workers:int=None,chunksize:int=None)->Corpus:
+    '''
+    读取多个ust、nn文件，返回Corpus对象
+    paths：文件名或通配符的列表，支持**
+    workers：进程数，默认为CPU核数，为1时在当前进程中读取
+    chunksize：每次交给工作进程的文件数，默认根据文件数与进程数决定
+    读取失败的文件不会中断读取，文件名与错误信息保存在返回值的errors中
+    '''
+    from .convert import _expand
+    filenames=_expand(paths)
+    if(workers is None):
+        workers=os.cpu_count() or 1
+    if(chunksize is None):
+        chunksize=max(1,min(256,len(filenames)//(workers*4)))
+    chunks=[filenames[i:i+chunksize] for i in range(0,len(filenames),chunksize)]
+    if(workers==1 or len(chunks)<=1):
+        return _merge([_parsechunk(chunk) for chunk in chunks])
+    with concurrent.futures.ProcessPoolExecutor(max_workers=workers) as executor:
+        futures=[executor.submit(_loadchunk,chunk) for chunk in chunks]
+    #退出with时所有批次都已完成，先释放全部共享内存再报告进程池本身的错误
+    parts=[_attach(f.result()) for f in futures if f.exception() is None]
+    for f in futures:
+        if(f.exception() is not None):
+            raise f.exception()
+    return _merge(parts)
@@ -1,8 +1,11 @@
 '''
-utaufile.dictionary包括歌词转换字典，供utaufile.replacelyric()使用
+utaufile.dictionary包括歌词转换字典，供utaufile.replacelyric()、Ustfile.transliterate()使用
 ro2hi:罗马音转平假名
 hi2ro:平假名转罗马音
+compile_dictionary()将字典编译为转换器，可以转换多音节歌词、VCV歌词和带前后缀的歌词
 '''
+from typing import Dict
+
 #罗马音转平假名
 ro2hi={
     "a":"あ",
@@ -343,4 +346,65 @@ hi2ro={
     "ギ":"ngi",
     "グ":"ngu",
     "ゲ":"nge",
-    "ゴ":"ngo"}
\ No newline at end of file
+    "ゴ":"ngo"}
+
+class Transliterator():
+    '''
+    编译后的歌词转换器，由compile_dictionary()生成，调用即可转换一个歌词
+    从左到右按前缀树贪婪地匹配字典中最长的键，不在字典中的字符（如空格、前后缀）保持不变
+    例如由ro2hi编译的转换器可以把"kakiku"转换为"かきく"，把"a ka"转换为"あ か"
+    转换结果按歌词缓存，缓存超过cachesize条时清空
+    转换器可以被pickle，在多个文件、多个进程中重复使用
+    '''
+    def __init__(self,dictionary:Dict[str,str],cachesize:int=65536):
+        self.cachesize:int=cachesize
+        #前缀树，每个节点为字典，键""保存在此结束的词的转换结果
+        self._trie={}
+        for (key,value) in dictionary.items():
+            if(key==""):
+                continue
+            node=self._trie
+            for c in key:
+                node=node.setdefault(c,{})
+            node[""]=value
+        self._cache={}
+
+    def __call__(self,lyric:str)->str:
+        result=self._cache.get(lyric)
+        if(result is None):
+            result=self._transliterate(lyric)
+            if(len(self._cache)>=self.cachesize):
+                self._cache.clear()
+            self._cache[lyric]=result
+        return result
+
+    def _transliterate(self,lyric:str)->str:
+        result=[]
+        i=0
+        n=len(lyric)
+        while(i<n):
+            node=self._trie
+            value=None
+            j=i
+            while(j<n and lyric[j] in node):
+                node=node[lyric[j]]
+                j+=1
+                if("" in node):
+                    value=node[""]
+                    end=j
+            if(value is None):
+                result.append(lyric[i])
+                i+=1
+            else:
+                result.append(value)
+                i=end
+        return "".join(result)
+
+def compile_dictionary(dictionary:Dict[str,str],cachesize:int=65536)->Transliterator:
+    '''
+    将歌词转换字典编译为转换器，返回Transliterator对象
+    例：
+        romaji=utaufile.dictionary.compile_dictionary(utaufile.dictionary.ro2hi)
+        romaji("kakiku")
+    '''
+    return Transliterator(dictionary,cachesize)
@@ -1,7 +1,10 @@
 '''
-utaufile.flag包括不同utau引擎的flag预设，供utaufile.parseflag()使用
+utaufile.flag包括flag的解析与生成，以及不同utau引擎的flag预设，供parseflag()使用
 包含resampler,moresampler
 '''
+import functools
+from typing import Iterable,List
+
 resampler={
     ('a',100),
     ('B',50),
@@ -43,3 +46,180 @@ moresampler={
     ('P', 86),
     ('t', 0),
     ('u', False)}
+
+def readint(flag):
+    for i in range(0,len(flag)):
+        if(not flag[i] in ("+","-","1","2","3","4","5","6","7","8","9","0")):
+            break
+    else:
+        i=i+1
+    value=int(flag[0:i])
+    flag=flag[i:]
+    return(flag,value)
+    
+class Flagparser():
+    '''
+    编译后的flag解析器，由compile_flags()生成
+    flagtype：由元组组成的集合，含义同parseflag()
+    cachesize：缓存的flag字符串数量上限，大多数音符的flag相同，解析结果会被缓存
+    每个位置按前缀树匹配最长的flag名，例如"Mt50"总是被解析为Mt=50，而不会先匹配到其他以M开头的flag
+    '''
+    def __init__(self,flagtype:set,cachesize:int=1024):
+        self.flagtype:set=flagtype
+        self.cachesize:int=cachesize
+        self.defaults:dict={i[0]:i[1] for i in flagtype}
+        #前缀树，每个节点为字典，键""保存在此结束的flag名
+        self._trie={}
+        for name in self.defaults:
+            node=self._trie
+            for c in name:
+                node=node.setdefault(c,{})
+            node[""]=name
+        self._cached=functools.lru_cache(maxsize=cachesize)(self._parse)
+
+    def __reduce__(self):
+        return (Flagparser,(self.flagtype,self.cachesize))
+
+    def _parse(self,flag:str)->tuple:
+        '''
+        解析flag，返回由(flag名,值)组成的元组
+        '''
+        return tuple((name,value) for (name,value,start,end) in self._tokens(flag))
+
+    def _tokens(self,flag:str)->list:
+        '''
+        解析flag，返回由(flag名,值,起点,终点)组成的列表，flag[起点:终点]为该flag在字符串中的原文
+        无法识别的部分不出现在列表中
+        '''
+        result=[]
+        i=0
+        n=len(flag)
+        while(i<n):
+            #最长匹配
+            node=self._trie
+            name=None
+            j=i
+            while(j<n and flag[j] in node):
+                node=node[flag[j]]
+                j+=1
+                if("" in node):
+                    name=node[""]
+                    end=j
+            if(name is None):
+                i+=1
+                continue
+            start=i
+            i=end
+            default=self.defaults[name]
+            if(type(default)==bool):
+                result.append((name,True,start,i))
+            elif(type(default)==int):
+                j=i
+                if(j<n and flag[j] in "+-"):
+                    j+=1
+                while(j<n and flag[j] in "0123456789"):
+                    j+=1
+                if(flag[i:j] not in ("","+","-")):
+                    result.append((name,int(flag[i:j]),start,j))
+                    i=j
+        return result
+
+    def parse(self,flag:str,usedefault:bool=False)->dict:
+        '''
+        解析flag，返回字典
+        usedefault：如果为True，则返回的字典会包含输入flag中没有的条目，且代入默认值
+        '''
+        if(usedefault):
+            flagdict=self.defaults.copy()
+            flagdict.update(self._cached(flag))
+            return flagdict
+        return dict(self._cached(flag))
+
+    def parse_many(self,flags:Iterable[str],usedefault:bool=False)->List[dict]:
+        '''
+        解析多个flag（例如一个工程中所有音符的flag），返回字典的列表
+        相同的flag字符串只解析一次
+        '''
+        parsed={}
+        result=[]
+        for flag in flags:
+            items=parsed.get(flag)
+            if(items is None):
+                items=parsed[flag]=self._cached(flag)
+            if(usedefault):
+                flagdict=self.defaults.copy()
+                flagdict.update(items)
+                result.append(flagdict)
+            else:
+                result.append(dict(items))
+        return result
+
+    def rewrite(self,flag:str,flagdict:dict)->str:
+        '''
+        修改flag字符串中的部分flag，返回新的flag字符串
+        flagdict：flag名:新的值，取默认值的flag被删除，原来没有的flag添加到末尾
+        预设中没有的部分（例如其他引擎的flag）原样保留，如果保留后无法得到正确的结果则抛出ValueError
+        例：
+            parser.rewrite("g-5Mt50H30",{"g":1})
+            "g1Mt50H30"
+        '''
+        tokens=self._tokens(flag)
+        parts=[]
+        i=0
+        for (name,value,start,end) in tokens:
+            parts.append(flag[i:start])
+            i=end
+            if(name in flagdict):
+                value=flagdict[name]
+                if(value==self.defaults[name]):
+                    continue
+                parts.append(dumpflag({name:value}))
+            else:
+                parts.append(flag[start:end])
+        parts.append(flag[i:])
+        existing={token[0] for token in tokens}
+        parts.append(dumpflag({name:value for (name,value) in flagdict.items()
+                               if name not in existing and value!=self.defaults[name]}))
+        result="".join(parts)
+        expected=self.parse(flag,usedefault=True)
+        expected.update(flagdict)
+        if(self.parse(result,usedefault=True)!=expected):
+            raise ValueError("cannot rewrite flags {!r} without changing their meaning".format(flag))
+        return result
+
+_compiled={}
+
+def compile_flags(flagtype:set,cachesize:int=1024)->Flagparser:
+    '''
+    将flag预设编译为解析器，返回Flagparser对象，同一预设只编译一次
+    flagtype：由元组组成的集合，每个元组第0项为字符串,例如"b","g","Mt"等，第1项为默认值。可参考utaufile.flag库
+    例：
+        parser=utaufile.flag.compile_flags(utaufile.flag.moresampler)
+        parser.parse("g-5Mt50")
+    '''
+    key=(frozenset(flagtype),cachesize)
+    parser=_compiled.get(key)
+    if(parser is None):
+        parser=_compiled[key]=Flagparser(flagtype,cachesize)
+    return parser
+
+def parseflag(flag:str,flagtype:set,usedefault:bool=False)->dict:
+    '''
+    解析flag，返回字典
+    flagtype：由元组组成的集合，每个元组第0项为字符串,例如"b","g","Mt"等，第1项为默认值。可参考utaufile.flag库
+    usedefault：如果为True，则返回的字典会包含输入flag中没有的条目，且代入默认值
+    '''
+    return compile_flags(flagtype).parse(flag,usedefault)
+
+def dumpflag(flagdict:dict)->str:
+    '''
+    将flag字典转换为字符串
+    '''
+    flag=""
+    for (key,value) in flagdict.items():
+        if(type(value)==bool):
+            if(value):
+                flag+=key
+        elif(type(value)==int):
+            flag+=key+str(value)
+    return flag
@@ -0,0 +1,280 @@
+'''
+utaufile.index包括歌词的n-gram倒排索引，用于在大量ust工程中查找包含某段歌词（及音程）的工程
+例：
+    from utaufile import index
+    idx=index.LyricIndex(n=3)
+    idx.add("a.ust",utaufile.openust("a.ust"))
+    idx.save("lyrics.idx")
+    idx=index.openindex("lyrics.idx")
+    idx.search(["さ","く","ら"],intervals=[2,2])
+保存与读取索引文件需要numpy，索引文件为.npz格式，读取时不使用pickle
+'''
+import gc
+import array
+from typing import Dict,List,Set,Tuple
+
+#索引文件格式版本
+_version=1
+
+class LyricIndex():
+    '''
+    歌词n-gram倒排索引
+    n：索引的最长歌词片段（音符数），查询更长的歌词时用其中各n-gram的交集筛选候选工程
+    每个工程按Ustfile.getlyric(ignoreR=True)的顺序索引，休止符不参与匹配
+    '''
+    def __init__(self,n:int=3):
+        self.n:int=n
+        #工程序号:名称，被删除的工程为None
+        self._names:List[str]=[]
+        #名称:工程序号
+        self._ids:Dict[str,int]={}
+        #工程序号:(歌词元组,音高元组,音符在原工程中的序号元组)
+        #从文件读取的索引中为该工程在_packed各数组中的序号，第一次使用时才转换为元组
+        self._sequences:Dict[int,Tuple[tuple,tuple,tuple]]={}
+        #歌词片段:包含该片段的工程序号集合
+        #从文件读取的索引中为该片段在_packed倒排表中的序号，第一次使用时才转换为集合
+        self._postings:Dict[tuple,Set[int]]={}
+        #从文件读取的各数组，由openindex()设置
+        self._packed:dict=None
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self,name:str)->bool:
+        return name in self._ids
+
+    @property
+    def names(self)->List[str]:
+        '''
+        已索引的工程名称
+        '''
+        return list(self._ids)
+
+    def _posting(self,gram:tuple)->Set[int]:
+        '''
+        获取包含该歌词片段的工程序号集合，没有则返回None
+        '''
+        ids=self._postings.get(gram)
+        if(ids is not None and type(ids) is not set):
+            packed=self._packed
+            offset=packed["postoffset"]
+            ids=self._postings[gram]=set(packed["ids"][offset[ids]:offset[ids+1]])
+        return ids
+
+    def _sequence(self,fileid:int,keep:bool=True)->Tuple[tuple,tuple,tuple]:
+        '''
+        获取工程的(歌词元组,音高元组,音符在原工程中的序号元组)
+        keep：如果为False，从文件读取的序列转换后不保存在索引中（保存索引时使用）
+        '''
+        sequence=self._sequences[fileid]
+        if(type(sequence) is int):
+            packed=self._packed
+            offset=packed["seqoffset"]
+            (start,end)=(offset[sequence],offset[sequence+1])
+            sequence=(tuple(packed["seqlyric"][start:end].tolist()),
+                      tuple(packed["seqnotenum"][start:end].tolist()),
+                      tuple(packed["seqposition"][start:end].tolist()))
+            if(keep):
+                self._sequences[fileid]=sequence
+        return sequence
+
+    def _grams(self,lyric:tuple)->set:
+        grams=set()
+        for k in range(1,self.n+1):
+            grams.update(lyric[i:i+k] for i in range(len(lyric)-k+1))
+        return grams
+
+    def add(self,name:str,ustfile):
+        '''
+        将一个ust工程加入索引，同名工程已存在时替换
+        name：工程名称，例如文件名
+        ustfile：Ustfile对象
+        '''
+        if(name in self._ids):
+            self.remove(name)
+        fileid=len(self._names)
+        self._names.append(name)
+        self._ids[name]=fileid
+        note=[(i,n) for (i,n) in enumerate(ustfile.note) if not n.isR()]
+        lyric=tuple(n.lyric for (i,n) in note)
+        self._sequences[fileid]=(lyric,
+                                 tuple(n.notenum for (i,n) in note),
+                                 tuple(i for (i,n) in note))
+        for gram in self._grams(lyric):
+            ids=self._posting(gram)
+            if(ids is None):
+                self._postings[gram]={fileid}
+            else:
+                ids.add(fileid)
+        return self
+
+    def remove(self,name:str):
+        '''
+        从索引中删除一个工程
+        '''
+        fileid=self._ids.pop(name)
+        self._names[fileid]=None
+        (lyric,notenum,position)=self._sequence(fileid)
+        del self._sequences[fileid]
+        for gram in self._grams(lyric):
+            ids=self._posting(gram)
+            ids.discard(fileid)
+            if(not ids):
+                del self._postings[gram]
+        return self
+
+    def _candidates(self,lyric:tuple)->Set[int]:
+        '''
+        由倒排索引求可能包含该歌词的工程序号集合
+        '''
+        n=self.n
+        if(len(lyric)<=n):
+            return self._posting(lyric) or set()
+        sets=[]
+        for i in range(len(lyric)-n+1):
+            ids=self._posting(lyric[i:i+n])
+            if(ids is None):
+                return set()
+            sets.append(ids)
+        sets.sort(key=len)
+        return sets[0].intersection(*sets[1:])
+
+    def search(self,lyric:List[str],intervals:List[int]=None)->List[Tuple[str,int]]:
+        '''
+        查找歌词序列，返回由(工程名称,起始音符序号)组成的列表，音符序号为该音符在原工程note中的序号
+        lyric：歌词列表，例如["さ","く","ら"]
+        intervals：可选，相邻音符的音程（半音数）列表，长度为len(lyric)-1，其中为None的项不限制
+        '''
+        lyric=tuple(lyric)
+        m=len(lyric)
+        if(m==0):
+            return []
+        if(intervals is not None and len(intervals)!=m-1):
+            raise ValueError("intervals must have len(lyric)-1 items")
+        result=[]
+        for fileid in sorted(self._candidates(lyric)):
+            (sequence,notenum,position)=self._sequence(fileid)
+            i=-1
+            while(True):
+                try:
+                    i=sequence.index(lyric[0],i+1)
+                except ValueError:
+                    break
+                if(sequence[i:i+m]!=lyric):
+                    continue
+                if(intervals is not None and not all(d is None or notenum[i+k+1]-notenum[i+k]==d
+                                                     for (k,d) in enumerate(intervals))):
+                    continue
+                result.append((self._names[fileid],position[i]))
+        return result
+
+    def files(self,lyric:List[str],intervals:List[int]=None)->List[str]:
+        '''
+        查找包含该歌词序列的工程，返回工程名称列表
+        '''
+        lyric=tuple(lyric)
+        if(intervals is None and 0<len(lyric)<=self.n):
+            #不长于n的歌词片段直接由倒排表得到结果，不必逐个工程确认
+            return [self._names[i] for i in sorted(self._candidates(lyric))]
+        return list(dict.fromkeys(name for (name,i) in self.search(lyric,intervals)))
+
+    def save(self,filename:str):
+        '''
+        将索引保存为.npz文件（需要numpy）
+        名称与歌词保存在字符串表中，音符序列、歌词片段与倒排表都连接为整数数组，歌词片段按长度排序
+        '''
+        import numpy as np
+        from .archive import _Strings
+        strings=_Strings()
+        names=[-1 if name is None else strings(name) for name in self._names]
+        fileids=sorted(self._sequences)
+        #大量整数用array保存，比列表节省内存
+        seqcount=array.array("q")
+        seqlyric=array.array("i")
+        seqnotenum=array.array("q")
+        seqposition=array.array("q")
+        for fileid in fileids:
+            (lyric,notenum,position)=self._sequence(fileid,keep=False)
+            seqcount.append(len(lyric))
+            seqlyric.extend(map(strings,lyric))
+            seqnotenum.extend(notenum)
+            seqposition.extend(position)
+        gramcount=array.array("i")
+        gramlyric=array.array("i")
+        counts=array.array("i")
+        ids=array.array("i")
+        packed=self._packed
+        for gram in sorted(self._postings,key=len):
+            posting=self._postings[gram]
+            if(type(posting) is set):
+                posting=sorted(posting)
+            else:
+                #从文件读取、尚未使用的倒排表已经有序
+                posting=packed["ids"][packed["postoffset"][posting]:packed["postoffset"][posting+1]]
+            gramcount.append(len(gram))
+            gramlyric.extend(map(strings,gram))
+            counts.append(len(posting))
+            ids.extend(posting)
+        (stringoffset,stringdata)=strings.columns()
+        with open(filename,"wb") as f:
+            np.savez(f,
+                     header=np.array([_version,self.n],dtype=np.int64),
+                     stringoffset=stringoffset,
+                     stringdata=stringdata,
+                     names=np.array(names,dtype=np.int32),
+                     fileids=np.array(fileids,dtype=np.int32),
+                     seqcount=np.frombuffer(seqcount,dtype=np.int64),
+                     seqlyric=np.frombuffer(seqlyric,dtype=np.int32),
+                     seqnotenum=np.frombuffer(seqnotenum,dtype=np.int64),
+                     seqposition=np.frombuffer(seqposition,dtype=np.int64),
+                     gramcount=np.frombuffer(gramcount,dtype=np.int32),
+                     gramlyric=np.frombuffer(gramlyric,dtype=np.int32),
+                     counts=np.frombuffer(counts,dtype=np.int32),
+                     ids=np.frombuffer(ids,dtype=np.int32))
+
+def openindex(filename:str)->LyricIndex:
+    '''
+    打开由LyricIndex.save()保存的索引文件，返回LyricIndex对象（需要numpy）
+    '''
+    import numpy as np
+    try:
+        with np.load(filename,allow_pickle=False) as z:
+            c={name:z[name] for name in z.files}
+        (version,n)=c["header"].tolist()
+    except Exception as e:
+        raise ValueError("not a lyric index: {}".format(filename)) from e
+    if(version!=_version):
+        raise ValueError("unsupported lyric index version: {}".format(version))
+    enabled=gc.isenabled()
+    gc.disable()
+    try:
+        offset=c["stringoffset"].tolist()
+        data=c["stringdata"].tobytes()
+        strings=np.empty(len(offset)-1,dtype=object)
+        strings[:]=[data[offset[i]:offset[i+1]].decode("utf-8","surrogateescape") for i in range(len(offset)-1)]
+        index=LyricIndex(n)
+        index._names=[None if i<0 else strings[i] for i in c["names"].tolist()]
+        index._ids={name:i for (i,name) in enumerate(index._names) if name is not None}
+        #音符序列与倒排表只记录序号，第一次使用时才转换为元组、集合
+        fileids=c["fileids"].tolist()
+        index._sequences=dict(zip(fileids,range(len(fileids))))
+        gramcount=c["gramcount"]
+        gramlyric=strings[c["gramlyric"]]
+        grams=[]
+        offset=0
+        #歌词片段按长度排序保存，同一长度的片段一次转换为元组
+        for k in np.unique(gramcount).tolist():
+            count=int((gramcount==k).sum())
+            grams+=map(tuple,gramlyric[offset:offset+count*k].reshape(count,k).tolist())
+            offset+=count*k
+        index._postings=dict(zip(grams,range(len(grams))))
+        index._packed={"seqoffset":np.concatenate([[0],np.cumsum(c["seqcount"])]).tolist(),
+                       "seqlyric":strings[c["seqlyric"]],
+                       "seqnotenum":c["seqnotenum"],
+                       "seqposition":c["seqposition"],
+                       "postoffset":np.concatenate([[0],np.cumsum(c["counts"])]).tolist(),
+                       "ids":memoryview(np.ascontiguousarray(c["ids"],dtype=np.int32)).cast("B").cast("i")}
+    finally:
+        if(enabled):
+            gc.enable()
+    return index
@@ -0,0 +1,437 @@
+'''
+utaufile.nn包括nn文件的解析与写入，依赖numpy
+'''
+import io
+import numpy as np
+from typing import Tuple,List
+from .ust import Ustnote,Ustfile
+
+#默认的平直曲线，由所有未指定曲线的音符共享，只读，与以前的默认值np.ones(100)*50相同为float64
+_flatcurve=np.full(100,50,dtype=np.float64)
+_flatcurve.flags.writeable=False
+
+class Nnnote():
+    '''
+    nn音符类
+    hanzi:歌词汉字，str
+    pinyin:歌词拼音，str
+    start:起点，以32分音符为单位（四分音符为8），int
+    length:长度，以32分音符为单位，int
+    notenum:音高，与midi及ust相同，即C4为60，音高越高，数值越大，int
+    注意：该notenum的表示法与nn文件不同，nn文件中音高的表示方法为B5为0，音高越低，数值越大
+    83-notenum
+    cle:清晰度，int
+    vel:急促度，int
+    por:滑音起始，int
+    viblen:颤音长度，int
+    vibdep:颤音幅度，int
+    vibrat:颤音速率，int
+    dyn:音量曲线，取值范围0~100，numpy.ndarray
+    pit:音高曲线，以50为基准，取值范围0~100，numpy.ndarray
+    pbs:音高弯曲灵敏度，取值范围是0至11，但实际上表示1至12，int
+    未指定dyn、pit的音符共享同一条只读的平直曲线，从缓存、存档恢复的音符共享只读的曲线矩阵，
+    第一次访问dyn、pit时才复制为该音符自己的曲线
+    '''
+    __slots__=("hanzi","pinyin","start","length","notenum","cle","vel","por",
+               "viblen","vibdep","vibrat","_dyn","_pit","pbs")
+
+    def __init__(self,hanzi:str,pinyin:str,start:int,length:int,
+            notenum:int,cle:int=50,vel:int=50,por:int=0,
+            viblen:int=0,vibdep:int=0,vibrat:int=0,dyn=None,
+            pit=None,pbs:int=0):
+        if(dyn is None):
+            dyn=_flatcurve
+        if(pit is None):
+            pit=_flatcurve
+        self.hanzi=hanzi
+        self.pinyin=pinyin
+        self.start=start
+        self.length=length
+        self.notenum=notenum
+        self.cle=cle
+        self.vel=vel
+        self.por=por
+        self.viblen=viblen
+        self.vibdep=vibdep
+        self.vibrat=vibrat
+        self._dyn=dyn
+        self._pit=pit
+        self.pbs=pbs
+
+    @property
+    def dyn(self):
+        if(_readonly(self._dyn)):
+            self._dyn=self._dyn.copy()
+        return self._dyn
+
+    @dyn.setter
+    def dyn(self,dyn):
+        self._dyn=dyn
+
+    @property
+    def pit(self):
+        if(_readonly(self._pit)):
+            self._pit=self._pit.copy()
+        return self._pit
+
+    @pit.setter
+    def pit(self,pit):
+        self._pit=pit
+
+    def __str__(self):
+        return self._line(_formatcurves([self._dyn])[0],_formatcurves([self._pit])[0])
+
+    def _line(self,dyn:str,pit:str)->str:
+        '''
+        使用已格式化的dyn、pit曲线生成nn文件中的一行
+        '''
+        return " ".join(["",self.hanzi,
+            self.pinyin,
+            str(self.start),
+            str(self.length),
+            str(83-self.notenum),
+            str(self.cle),
+            str(self.vel),
+            str(self.por),
+            str(self.viblen),
+            str(self.vibdep),
+            str(self.vibrat),
+            dyn,
+            pit,
+            str(self.pbs)])+"\n"
+    
+    def getpitbend(self):
+        '''
+        获得音符的pit参数对音符的作用量（pit*pbs）,单位为半音，返回numpy.ndarray
+        '''
+        return (self._pit-50)*(self.pbs+1)/50
+    
+    def setpitbend(self,pitbend):
+        '''
+        设置音符的pit参数对音符的作用量（pit*pbs）,单位为半音，输入类型为长度100的numpy.ndarray
+        '''
+        (pit,pbs)=_setpitbend(np.asarray(pitbend,dtype=float)[np.newaxis])
+        self.pbs=int(pbs[0])
+        self.pit=pit[0]
+        
+class Nnfile():
+    '''
+    nn文件类
+    tempo:曲速，float
+    beats:节拍，元组，第0项为每小节拍数，第1项为以X分音符为1拍
+    note:音符，Nnnote的列表
+    '''
+    def __init__(self,
+                 tempo:float=120.0,
+                 beats:Tuple[int,int]=(4,4),
+                 note:List[Nnnote]=[]):
+        if(note==[]):
+            note=[]
+        self.tempo:float=tempo
+        self.beats:Tuple[int,int]=beats
+        self.note:List[Nnnote]=note
+            
+    def sort(self):
+        '''
+        音符按开始时间排序
+        '''
+        def sortkey(note):
+            return note.start
+        self.note=sorted(self.note,key=sortkey)
+        return self
+    
+    def __str__(self):
+        s=io.StringIO()
+        self.write(s)
+        return s.getvalue()
+
+    def write(self,file):
+        '''
+        将工程逐行写入以文本模式打开的文件对象
+        '''
+        self.sort()
+        nbars=int((self.note[-1].start+self.note[-1].length)/(32*self.beats[0]/self.beats[1]))+1
+        file.write("{:.1f} {} {} {} 19 0 0 0 0 0\n{}\n".format(
+            self.tempo,
+            self.beats[0],
+            self.beats[1],
+            nbars,
+            len(self.note)))
+        #每次格式化一批音符的曲线，避免为整个工程生成字符串
+        for i in range(0,len(self.note),4096):
+            notes=self.note[i:i+4096]
+            try:
+                dyns=_formatcurves([n._dyn for n in notes])
+                pits=_formatcurves([n._pit for n in notes])
+            except ValueError:
+                #各音符曲线长度不同
+                dyns=[_formatcurves([n._dyn])[0] for n in notes]
+                pits=[_formatcurves([n._pit])[0] for n in notes]
+            file.write("".join([n._line(dyn,pit) for (n,dyn,pit) in zip(notes,dyns,pits)]))
+
+    def save(self,filename:str):
+        '''
+        保存nn文件
+        '''
+        with open(filename,encoding="utf8",mode="w",buffering=1<<16) as file:
+            self.write(file)
+    
+    def transpose(self,n:int):
+        """
+        对nn工程移调
+        n：移调半音数，向上为正，向下为负。
+        """
+        for note in self.note:
+            note.notenum+=n
+        return self
+
+    def get_pitbend_matrix(self):
+        '''
+        获得所有音符的pit参数对音符的作用量（pit*pbs），单位为半音
+        返回numpy.ndarray矩阵，每行为一个音符，各音符的曲线长度必须相同
+        '''
+        return _getpitbend(_stackcurves([n._pit for n in self.note]),
+                           np.array([n.pbs for n in self.note]))
+
+    def set_pitbend_matrix(self,pitbend):
+        '''
+        设置所有音符的pit参数对音符的作用量（pit*pbs），单位为半音
+        pitbend：矩阵，每行为一个音符，每个音符的pbs由该行的最大偏移量决定
+        '''
+        (pit,pbs)=_setpitbend(pitbend)
+        for (note,p,b) in zip(self.note,pit,pbs.tolist()):
+            note.pit=p
+            note.pbs=b
+        return self
+
+    def to_arrays(self):
+        '''
+        将nn文件对象转换为列式表示NnArrays，用于对大量音符的向量化分析与编辑
+        '''
+        from .arrays import NnArrays
+        note=self.note
+        return NnArrays(hanzi=[n.hanzi for n in note],
+                        pinyin=[n.pinyin for n in note],
+                        start=[n.start for n in note],
+                        length=[n.length for n in note],
+                        notenum=[n.notenum for n in note],
+                        cle=[n.cle for n in note],
+                        vel=[n.vel for n in note],
+                        por=[n.por for n in note],
+                        viblen=[n.viblen for n in note],
+                        vibdep=[n.vibdep for n in note],
+                        vibrat=[n.vibrat for n in note],
+                        dyn=_stackcurves([n._dyn for n in note]),
+                        pit=_stackcurves([n._pit for n in note]),
+                        pbs=[n.pbs for n in note],
+                        tempo=self.tempo,
+                        beats=self.beats)
+
+    def to_ust_file(self,use_hanzi:bool=False):
+        '''
+        将nn文件对象转换为ust文件对象
+        默认使用nn文件中的拼音，如果需要使用汉字，use_hanzi=True
+        '''
+        ust=Ustfile(tempo=self.tempo)
+        time=0
+        for note in self.note:
+            if(note.start>time):
+                ust.note+=[Ustnote(length=(note.start-time)*60,lyric="R",notenum=60)]
+            if(use_hanzi):
+                lyric=note.hanzi
+            else:
+                lyric=note.pinyin
+            ust.note+=[Ustnote(length=note.length*60,lyric=lyric,notenum=note.notenum)]
+            time=note.length+note.start
+        return ust
+    
+    def to_midi_track(self,use_hanzi:bool=False):
+        '''
+        将nn文件对象转换为mido.MidiTrack对象
+        默认使用nn文件中的拼音，如果需要使用汉字，use_hanzi=True
+        '''
+        import mido
+        track=mido.MidiTrack()
+        time=0
+        for note in self.note:
+            if(use_hanzi):
+                track.append(mido.MetaMessage('lyrics',text=note.hanzi,time=(note.start-time)*60))
+            else:
+                track.append(mido.MetaMessage('lyrics',text=note.pinyin,time=(note.start-time)*60))
+            track.append(mido.Message('note_on', note=note.notenum,velocity=64,time=0))
+            track.append(mido.Message('note_off',note=note.notenum,velocity=64,time=note.length*60))
+            time=note.start+note.length
+        track.append(mido.MetaMessage('end_of_track'))
+        return track
+    
+    def to_midi_file(self,filename:str="",use_hanzi:bool=False):
+        '''
+        将nn文件对象转换为mid文件与mido.MidiFile对象
+        默认使用nn文件中的拼音，如果需要使用汉字，use_hanzi=True
+        '''
+        import mido
+        mid = mido.MidiFile()
+        ctrltrack=mido.MidiTrack()
+        ctrltrack.append(mido.MetaMessage('track_name',name='Control',time=0))
+        ctrltrack.append(mido.MetaMessage('set_tempo',tempo=mido.bpm2tempo(self.tempo),time=0))
+        mid.tracks.append(ctrltrack)
+        mid.tracks.append(self.to_midi_track(use_hanzi))
+        if(filename!=""):
+            mid.save(filename)
+        return mid
+        pass
+            
+    def to_music21_stream(self,use_hanzi:bool=False):
+        '''
+        将nn文件对象转换为music21 stream，并自动判断调性
+        默认使用nn文件中的拼音，如果需要使用汉字，use_hanzi=True
+        '''
+        import music21
+        st=self.to_ust_file(use_hanzi=use_hanzi).to_music21_stream()
+        ts=music21.meter.TimeSignature()
+        (ts.numerator,ts.denominator)=self.beats
+        st.insert(ts)
+        return st
+
+    def to_dv_segment(self):
+        '''
+        将nn文件对象转换为dv区段对象
+        '''
+        import dvfile
+        dvnotes=[]
+        for n in self.note:
+            dvnotes.append(dvfile.Dvnote(n.start*60,n.length*60,n.notenum,n.pinyin,n.hanzi))
+        return dvfile.Dvsegment(start=7680*self.beats[0]//self.beats[1],
+                                length=dvnotes[-1].start+dvnotes[-1].length,
+                                note=dvnotes)
+
+    def to_dv_track(self):
+        '''
+        将nn文件对象转换为dv音轨对象
+        '''
+        import dvfile
+        return dvfile.Dvtrack(segment=[self.to_dv_segment()])
+
+    def to_dv_file(self):
+        '''
+        将nn文件对象转换为dv文件对象
+        '''
+        import dvfile
+        return dvfile.Dvfile(tempo=[(0,self.tempo)],
+                             beats=[(-3,self.beats[0],self.beats[1])],
+                             track=[self.to_dv_track()])
+
+def _readonly(curve)->bool:
+    return isinstance(curve,np.ndarray) and not curve.flags.writeable
+
+def _newnnnotes(columns)->List[Nnnote]:
+    '''
+    批量创建音符，用于从缓存、存档中大量恢复音符
+    columns：由Nnnote各参数组成的可迭代对象，顺序与Nnnote()的参数相同
+    '''
+    new=Nnnote.__new__
+    notes=[]
+    for (hanzi,pinyin,start,length,notenum,cle,vel,por,viblen,vibdep,vibrat,dyn,pit,pbs) in columns:
+        note=new(Nnnote)
+        note.hanzi=hanzi
+        note.pinyin=pinyin
+        note.start=start
+        note.length=length
+        note.notenum=notenum
+        note.cle=cle
+        note.vel=vel
+        note.por=por
+        note.viblen=viblen
+        note.vibdep=vibdep
+        note.vibrat=vibrat
+        note._dyn=dyn
+        note._pit=pit
+        note.pbs=pbs
+        notes.append(note)
+    return notes
+
+def _stackcurves(curves:list):
+    '''
+    将各音符的曲线合并为矩阵，每行为一个音符
+    '''
+    if(len(curves)==0):
+        return np.zeros((0,100),dtype=np.int64)
+    return np.array(curves)
+
+def _getpitbend(pit,pbs):
+    '''
+    由pit矩阵（每行为一个音符）与pbs向量计算音高偏移量，单位为半音
+    '''
+    return (pit-50)*(np.asarray(pbs)[:,np.newaxis]+1)/50
+
+def _setpitbend(pitbend):
+    '''
+    由音高偏移量矩阵（每行为一个音符，单位为半音）计算pit矩阵与pbs向量
+    每行的pbs由该行的最大偏移量决定，偏移量全为0的行pbs为0
+    '''
+    pitbend=np.asarray(pitbend,dtype=float)
+    if(pitbend.size==0):
+        return (pitbend,np.zeros(len(pitbend),dtype=np.int64))
+    pbs=np.clip(np.ceil(np.abs(pitbend).max(axis=1)),1,12).astype(np.int64)-1
+    pit=pitbend/(pbs[:,np.newaxis]+1)*50+50
+    return (pit,pbs)
+
+def _formatcurves(curves)->List[str]:
+    '''
+    将多个音符的曲线一次性格式化为nn文件中的字符串（"100,v1,v2,...,v100"），曲线中的值向0取整
+    curves：各音符曲线组成的列表，或每行为一个音符的矩阵，各行长度必须相同
+    '''
+    matrix=np.asarray(curves).astype(np.int64)
+    if(matrix.size==0):
+        return ["100"]*len(matrix)
+    low=int(matrix.min())
+    high=int(matrix.max())
+    if(high-low<65536):
+        #曲线的取值范围很小，查表得到每个数的字符串
+        table=np.array([str(i) for i in range(low,high+1)],dtype=object)
+        rows=table[matrix-low].tolist()
+    else:
+        rows=[map(str,row) for row in matrix.tolist()]
+    return ["100,"+",".join(row) for row in rows]
+
+def _parsecurves(curves:List[str]):
+    '''
+    将所有音符的曲线字符串（"100,v1,v2,...,v100"，第0项为点数）一次性解析为整数矩阵，每行为一个音符
+    各行长度不同时，返回各音符的numpy.ndarray组成的列表
+    '''
+    if(curves==[]):
+        return np.zeros((0,100),dtype=np.int64)
+    try:
+        return np.loadtxt(curves,delimiter=",",dtype=np.int64,ndmin=2)[:,1:]
+    except ValueError:
+        return [np.array([int(i) for i in c.split(",")[1:]]) for c in curves]
+
+def opennn(filename:str):
+    '''
+    打开nn文件，返回Nnfile对象
+    '''
+    with open(filename,"r",encoding="utf8") as file:
+        line=file.readline().split(" ")
+        tempo=float(line[0])
+        beats=(int(line[1]),int(line[2]))
+        file.readline()
+        lines=[i.strip(" \n").split(" ") for i in file.readlines()]
+    #所有音符的dyn、pit曲线分别一次性解析，每个音符使用矩阵中的一行
+    dyns=_parsecurves([line[11] for line in lines])
+    pits=_parsecurves([line[12] for line in lines])
+    note=[]
+    for (line,dyn,pit) in zip(lines,dyns,pits):
+        hanzi=line[0]
+        pinyin=line[1]
+        start=int(line[2])
+        length=int(line[3])
+        notenum=83-int(line[4])
+        cle=int(line[5])
+        vel=int(line[6])
+        por=int(line[7])
+        viblen=int(line[8])
+        vibdep=int(line[9])
+        vibrat=int(line[10])
+        pbs=int(line[13])
+        note+=[Nnnote(hanzi,pinyin,start,length,notenum,cle,vel,por,viblen,vibdep,vibrat,dyn,pit,pbs)]
+    return Nnfile(tempo=tempo,beats=beats,note=note)
@@ -0,0 +1,144 @@
+'''
+utaufile.plugin用于编写UTAU插件
+UTAU每次调用插件时，将选中的音符写入一个临时ust文件，并将其路径作为命令行参数传给插件
+临时文件中，[#PREV]、[#NEXT]块为选区前后的音符（只读），[#NNNN]块为选中的音符
+插件退出前把修改写回该文件，UTAU按[#NNNN]、[#INSERT]、[#DELETE]块更新工程
+例：
+    import sys
+    from utaufile import plugin
+    p=plugin.openplugin(sys.argv[1])
+    for note in p.note:
+        note.lyric=note.lyric.replace("a","i")
+    p.save(sys.argv[1])
+'''
+import os
+from typing import List
+from .ust import Ustnote,Ustfile,_iterustblocks,_parseustblock,_lazyustnote
+
+class Utauplugin(Ustfile):
+    '''
+    UTAU插件临时文件类
+    note:选中的音符，list，可以修改、插入、删除
+    prev:选区前一个音符，Ustnote，没有则为None
+    next:选区后一个音符，Ustnote，没有则为None
+    tempo:曲速，float
+    properties:工程整体属性(即[#SETTING]块),dict
+    encoding:临时文件的编码，写回时使用相同的编码
+    保存时，未修改的音符只写出块头，修改过的音符写出全部数据，被删除的属性写为"键="，
+    新增的音符写为[#INSERT]块，被删除的音符写为[#DELETE]块
+    '''
+    def __init__(self,
+                 note:List[Ustnote]=[],
+                 tempo:float=120,
+                 properties:dict={},
+                 prev:Ustnote=None,
+                 next:Ustnote=None,
+                 encoding:str="shift-JIS",
+                 names:List[str]=None):
+        super().__init__(note=note,tempo=tempo,properties=properties)
+        self.prev:Ustnote=prev
+        self.next:Ustnote=next
+        self.encoding:str=encoding
+        #打开文件时的音符及其块名，用于判断哪些音符被插入、删除
+        self._original:List[Ustnote]=list(self.note)
+        if(names is None):
+            names=["#{:0>4}".format(i) for i in range(len(self.note))]
+        self._names:List[str]=names
+        #打开文件时各音符块中的键，被删除的键写回时需要写出"键="，否则UTAU保留原来的值
+        self._originalkeys:List[set]=[_blockkeys(n) for n in self._original]
+
+    def write(self,file):
+        '''
+        将修改逐块写入以文本模式打开的文件对象
+        '''
+        if(self.encoding=="utf-8"):
+            file.write("[#VERSION]\nUST Version1.2\nCharset=UTF-8\n")
+        else:
+            file.write("[#VERSION]\nUST Version1.2\n")
+        self._writesetting(file)
+        if(self.prev is not None):
+            file.write("[#PREV]\n")
+            self.prev.write(file)
+        index={id(n):i for (i,n) in enumerate(self._original)}
+        #pointer之前的原有音符都已写出
+        pointer=0
+        for note in self.note:
+            i=index.get(id(note))
+            if(i is None or i<pointer):
+                file.write("[#INSERT]\n")
+                note.write(file)
+                continue
+            file.write("[#DELETE]\n"*(i-pointer))
+            pointer=i+1
+            file.write("[{}]\n".format(self._names[i]))
+            if(not note._clean):
+                note.write(file)
+                removed=self._originalkeys[i]-note._getproperties().keys()
+                if(removed):
+                    file.write("".join("{}=\n".format(key) for key in sorted(removed)))
+        file.write("[#DELETE]\n"*(len(self._original)-pointer))
+        if(self.next is not None):
+            file.write("[#NEXT]\n")
+            self.next.write(file)
+        file.write("[#TRACKEND]\n")
+
+    def save(self,filename:str):
+        '''
+        将修改写回插件临时文件
+        '''
+        with open(filename,"w",encoding=self.encoding,newline=self.properties.get("_newline")) as file:
+            self.write(file)
+
+def _blockkeys(note:Ustnote)->set:
+    '''
+    获取音符块中除Length、Lyric、NoteNum外的所有键
+    '''
+    if(note._raw is None):
+        return set(note._getproperties())
+    keys=set()
+    for line in note._raw.split("\n"):
+        if("=" in line):
+            keys.add(line.split("=",1)[0])
+    keys-={"Length","Lyric","NoteNum"}
+    return keys
+
+def openplugin(filename:str)->Utauplugin:
+    '''
+    打开UTAU插件临时文件，返回Utauplugin对象
+    filename：文件名（str或os.PathLike），或以二进制模式打开的文件对象
+    '''
+    if(isinstance(filename,(str,os.PathLike))):
+        with open(filename,"rb") as f:
+            return openplugin(f)
+    encoding="shift-JIS"
+    properties={}
+    prev=None
+    next=None
+    note=[]
+    names=[]
+    info={}
+    for (name,block) in _iterustblocks(filename,info=info):
+        if(name=="#VERSION"):
+            if("Charset=UTF-8" in block):
+                encoding="utf-8"
+        elif(name=="#SETTING"):
+            properties=_parseustblock(block)
+            properties["_rawsetting"]="\n".join(block)
+        elif(name=="#PREV"):
+            prev=_lazyustnote(block,keepraw=True)
+        elif(name=="#NEXT"):
+            next=_lazyustnote(block,keepraw=True)
+        elif(name=="#TRACKEND"):
+            break
+        else:
+            names.append(name)
+            note.append(_lazyustnote(block,keepraw=True))
+    properties["_newline"]=info.get("newline")
+    tempo=properties.pop("Tempo",120.0)
+    return Utauplugin(note=note,
+                      tempo=tempo,
+                      properties=properties,
+                      prev=prev,
+                      next=next,
+                      encoding=encoding,
+                      names=names)
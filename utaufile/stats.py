@@ -0,0 +1,136 @@
+'''
+utaufile.stats用于统计列式语料库（utaufile.corpus.Corpus）中的音高、时长、歌词等分布，依赖numpy
+所有统计都对整个语料库向量化计算，加入新文件时用update()增量更新，不必重新计算已统计的文件
+例：
+    from utaufile import corpus,stats
+    s=stats.Stats(corpus.load(["data/**/*.ust"]))
+    s.update(corpus.load(["new/*.ust"]))
+    print(s.nrange(),s.restratio(),s.lyricfrequency(10))
+'''
+import collections
+import numpy as np
+from typing import List
+
+class Stats():
+    '''
+    语料库统计，休止符不计入音高与歌词统计
+    lengthbin:时长直方图的分度值（480为一拍），int
+    notenum:音高直方图，第i项为音高为i的音符数，长度128，numpy.ndarray
+    length:时长直方图，第i项为时长在[i*lengthbin,(i+1)*lengthbin)内的音符数（含休止符），numpy.ndarray
+    lyrics:歌词出现次数，collections.Counter
+    tempo:曲速分布，每个文件计一次，collections.Counter
+    notes,rests:音符总数、休止符数，int
+    totallength,restlength:音符总时长、休止符总时长，int
+    files:已统计的文件名，list
+    filenotes,filerests,filelength,filetempo:每个文件的音符数、休止符数、总时长、曲速，numpy.ndarray
+    filelow,filehigh:每个文件的音域（最低音,最高音+1），没有非休止符音符的文件为-1，numpy.ndarray
+    '''
+    def __init__(self,corpus=None,lengthbin:int=60):
+        self.lengthbin:int=lengthbin
+        self.notenum=np.zeros(128,dtype=np.int64)
+        self.length=np.zeros(0,dtype=np.int64)
+        self.lyrics=collections.Counter()
+        self.tempo=collections.Counter()
+        self.notes:int=0
+        self.rests:int=0
+        self.totallength:int=0
+        self.restlength:int=0
+        self.files:List[str]=[]
+        self.filenotes=np.zeros(0,dtype=np.int64)
+        self.filerests=np.zeros(0,dtype=np.int64)
+        self.filelength=np.zeros(0,dtype=np.int64)
+        self.filetempo=np.zeros(0,dtype=np.float64)
+        self.filelow=np.zeros(0,dtype=np.int64)
+        self.filehigh=np.zeros(0,dtype=np.int64)
+        if(corpus is not None):
+            self.update(corpus)
+
+    def update(self,corpus):
+        '''
+        将一个语料库（通常是新加入的文件）的统计合并到当前统计中
+        corpus：utaufile.corpus.Corpus对象
+        '''
+        rest=corpus.rest
+        sound=~rest
+        notenum=corpus.notenum[sound]
+        #音高直方图
+        self.notenum+=np.bincount(np.clip(notenum,0,127),minlength=128)
+        #时长直方图
+        lengthcount=np.bincount(corpus.length//self.lengthbin)
+        if(len(lengthcount)>len(self.length)):
+            self.length=np.concatenate([self.length,np.zeros(len(lengthcount)-len(self.length),dtype=np.int64)])
+        self.length[:len(lengthcount)]+=lengthcount
+        #歌词频率
+        lyriccount=np.bincount(corpus.lyric[sound],minlength=len(corpus.lyrics))
+        used=np.flatnonzero(lyriccount)
+        self.lyrics.update({corpus.lyrics[i]:c for (i,c) in zip(used.tolist(),lyriccount[used].tolist())})
+        #休止符
+        self.notes+=len(rest)
+        self.rests+=int(rest.sum())
+        self.totallength+=int(corpus.length.sum())
+        self.restlength+=int(corpus.length[rest].sum())
+        #曲速
+        self.tempo.update(corpus.tempo.tolist())
+        #每个文件的统计
+        nfiles=len(corpus.files)
+        fileid=corpus.fileid
+        low=np.full(nfiles,128,dtype=np.int64)
+        high=np.full(nfiles,-1,dtype=np.int64)
+        np.minimum.at(low,fileid[sound],notenum)
+        np.maximum.at(high,fileid[sound],notenum)
+        empty=high<0
+        low[empty]=-1
+        high[~empty]+=1
+        self.files+=corpus.files
+        self.filenotes=np.concatenate([self.filenotes,np.bincount(fileid,minlength=nfiles)])
+        self.filerests=np.concatenate([self.filerests,np.bincount(fileid[rest],minlength=nfiles)])
+        self.filelength=np.concatenate([self.filelength,
+                                        np.bincount(fileid,weights=corpus.length,minlength=nfiles).astype(np.int64)])
+        self.filetempo=np.concatenate([self.filetempo,corpus.tempo])
+        self.filelow=np.concatenate([self.filelow,low])
+        self.filehigh=np.concatenate([self.filehigh,high])
+        return self
+
+    def nrange(self)->tuple:
+        '''
+        获取所有文件的总音域
+        返回元组：(最低音,最高音+1)
+        '''
+        used=np.flatnonzero(self.notenum)
+        return (int(used[0]),int(used[-1])+1)
+
+    def restratio(self)->float:
+        '''
+        休止符占音符总数的比例
+        '''
+        return self.rests/self.notes if self.notes else 0.0
+
+    def restlengthratio(self)->float:
+        '''
+        休止符占总时长的比例
+        '''
+        return self.restlength/self.totallength if self.totallength else 0.0
+
+    def lyricfrequency(self,n:int=None)->list:
+        '''
+        获取出现次数最多的n个歌词，返回由(歌词,次数)组成的列表，n为None时返回全部
+        '''
+        return self.lyrics.most_common(n)
+
+    def rangehistogram(self)->np.ndarray:
+        '''
+        各文件音域宽度（半音数）的直方图，不含没有非休止符音符的文件
+        '''
+        used=self.filelow>=0
+        return np.bincount(self.filehigh[used]-self.filelow[used])
+
+    def summary(self,i:int)->dict:
+        '''
+        获取第i个文件的统计，返回字典
+        '''
+        return {"file":self.files[i],
+                "notes":int(self.filenotes[i]),
+                "rests":int(self.filerests[i]),
+                "length":int(self.filelength[i]),
+                "tempo":float(self.filetempo[i]),
+                "nrange":(int(self.filelow[i]),int(self.filehigh[i]))}
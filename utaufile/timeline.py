@@ -0,0 +1,99 @@
+'''
+utaufile.timeline包括曲速表（TempoMap），用于在ust工程的时刻（480为一拍）与绝对时间（毫秒）之间换算，依赖numpy
+ust工程的曲速由[#SETTING]中的Tempo与音符properties中的"Tempo"决定，音符的Tempo从该音符的起点开始生效
+例：
+    u=utaufile.openust("song.ust")
+    tm=u.tempomap()
+    tm.ticks_to_ms([0,480,960])
+    (start,end)=utaufile.timeline.notetimes(u,tm)
+'''
+import numpy as np
+from typing import List,Tuple
+
+class TempoMap():
+    '''
+    曲速表，由Ustfile.tempomap()生成
+    ticks:各曲速段的起点（480为一拍），第一项为0，numpy.ndarray
+    tempo:各曲速段的曲速，numpy.ndarray
+    ms:各曲速段起点的绝对时间（毫秒），numpy.ndarray
+    '''
+    def __init__(self,ticks:List[int],tempo:List[float]):
+        self.ticks=np.asarray(ticks,dtype=np.int64)
+        self.tempo=np.asarray(tempo,dtype=np.float64)
+        #每个时刻的毫秒数
+        self._mspertick=60000/(self.tempo*480)
+        self.ms=np.concatenate([[0.0],np.cumsum(np.diff(self.ticks)*self._mspertick[:-1])])
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def changes(self)->List[Tuple[int,float]]:
+        '''
+        获取曲速变化点，返回由(时刻,曲速)组成的列表
+        '''
+        return list(zip(self.ticks.tolist(),self.tempo.tolist()))
+
+    def _segment(self,ticks):
+        return np.maximum(np.searchsorted(self.ticks,ticks,side="right")-1,0)
+
+    def tempo_at(self,ticks):
+        '''
+        获取给定时刻的曲速
+        ticks：时刻（480为一拍），数字或数组
+        '''
+        return self.tempo[self._segment(ticks)]
+
+    def ticks_to_ms(self,ticks):
+        '''
+        将时刻（480为一拍）转换为绝对时间（毫秒）
+        ticks：数字或数组，返回相同形状的float或numpy.ndarray
+        '''
+        ticks=np.asarray(ticks)
+        k=self._segment(ticks)
+        return self.ms[k]+(ticks-self.ticks[k])*self._mspertick[k]
+
+    def ms_to_ticks(self,ms):
+        '''
+        将绝对时间（毫秒）转换为时刻（480为一拍），ticks_to_ms()的逆操作
+        ms：数字或数组，返回相同形状的float或numpy.ndarray
+        '''
+        ms=np.asarray(ms)
+        k=np.maximum(np.searchsorted(self.ms,ms,side="right")-1,0)
+        return self.ticks[k]+(ms-self.ms[k])/self._mspertick[k]
+
+def notetimes(ustfile,tempomap:TempoMap=None):
+    '''
+    获取各音符起点、终点的绝对时间（毫秒）
+    tempomap：曲速表，默认为ustfile.tempomap()
+    返回元组：(起点数组,终点数组)
+    '''
+    if(tempomap is None):
+        tempomap=ustfile.tempomap()
+    ms=tempomap.ticks_to_ms(ustfile._tickindex())
+    return (ms[:-1],ms[1:])
+
+def rendertimes(ustfile,tempomap:TempoMap=None):
+    '''
+    获取各音符实际发声区间的绝对时间（毫秒），考虑先行发声（PreUtterance）与重叠（VoiceOverlap）
+    音符的声音从起点前PreUtterance毫秒开始，持续到下一个音符的声音开始后VoiceOverlap毫秒
+    未指定PreUtterance、VoiceOverlap的音符按0计算，休止符的区间即为音符本身的区间
+    tempomap：曲速表，默认为ustfile.tempomap()
+    返回元组：(起点数组,终点数组)
+    '''
+    (start,end)=notetimes(ustfile,tempomap)
+    n=len(ustfile.note)
+    rest=np.zeros(n,dtype=bool)
+    pre=np.zeros(n)
+    overlap=np.zeros(n)
+    for (i,note) in enumerate(ustfile.note):
+        if(note.isR()):
+            rest[i]=True
+        else:
+            properties=note._getproperties()
+            pre[i]=properties.get("PreUtterance",0)
+            overlap[i]=properties.get("VoiceOverlap",0)
+    renderstart=start-pre
+    renderend=end.copy()
+    renderend[:-1]+=overlap[1:]-pre[1:]
+    renderend[rest]=end[rest]
+    return (renderstart,renderend)
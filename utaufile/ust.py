@@ -0,0 +1,979 @@
+'''
+utaufile.ust包括ust文件的解析与写入，不依赖numpy
+'''
+import io
+import os
+import sys
+import bisect
+import itertools
+from typing import Dict,List
+from . import flag
+
+#音符时长的修改次数，任何音符的length被修改后，Ustfile的时间索引都会重建
+#音符列表本身的修改（增删、替换、重新排序）由_NoteList记录
+_lengthversion=0
+
+def _same(new,old)->bool:
+    '''
+    判断新值与原值是否相同，类型不同（例如480与480.0）时写出的文本不同，视为不同
+    '''
+    return type(new) is type(old) and new==old
+
+class Ustnote():
+    '''
+    ust音符类
+    length:时长，480为一拍，int
+    lyric:歌词，str
+    notenum:音高,C4为60，int
+    properties:其他所有数据，dict
+    properties中，以"_"开头的键被视为临时变量，不被写入UST文件
+    使用openust(lazy=True)打开时，properties在第一次访问时才被解析
+    使用openust(keepraw=True)打开时，未被修改的音符在保存时原样写出原文
+    读取properties即视为修改，因为无法得知返回的字典是否被改动
+    '''
+    #_raw:音符块原文，_clean:音符未被修改，保存时可原样写出_raw
+    __slots__=("_length","_lyric","_notenum","_properties","_raw","_clean")
+
+    def __init__(self,length:int,
+                 lyric:str,
+                 notenum:int,
+                 properties:dict={}):
+        if(properties=={}):
+            properties={}
+        self._raw=None
+        self._clean=False
+        #新建的音符还不在任何工程中，不必使时间索引失效
+        self._length=length
+        self._lyric=lyric
+        self._notenum=notenum
+        self.properties=properties
+
+    @property
+    def length(self)->int:
+        return self._length
+
+    #赋值与原来相同（值与类型都相同）时不视为修改，keepraw时该音符仍可原样写出
+    @length.setter
+    def length(self,length:int):
+        global _lengthversion
+        if(_same(length,self._length)):
+            return
+        self._length=length
+        self._clean=False
+        _lengthversion+=1
+
+    @property
+    def lyric(self)->str:
+        return self._lyric
+
+    @lyric.setter
+    def lyric(self,lyric:str):
+        if(_same(lyric,self._lyric)):
+            return
+        self._lyric=lyric
+        self._clean=False
+
+    @property
+    def notenum(self)->int:
+        return self._notenum
+
+    @notenum.setter
+    def notenum(self,notenum:int):
+        if(_same(notenum,self._notenum)):
+            return
+        self._notenum=notenum
+        self._clean=False
+
+    @property
+    def properties(self)->dict:
+        properties=self._getproperties()
+        self._raw=None
+        self._clean=False
+        return properties
+
+    @properties.setter
+    def properties(self,properties:dict):
+        self._properties=properties
+        self._raw=None
+        self._clean=False
+
+    def _getproperties(self)->dict:
+        '''
+        只读地获取properties，不将音符标记为已修改
+        '''
+        if(self._properties is None):
+            self._properties=_parseustblock(self._raw.split("\n"))
+            for i in ["Length","Lyric","NoteNum"]:
+                self._properties.pop(i,None)
+            if(not self._clean):
+                self._raw=None
+        return self._properties
+
+    def __str__(self):
+        s=io.StringIO()
+        self.write(s)
+        return s.getvalue()
+
+    def write(self,file,_formatted:dict=None):
+        '''
+        将音符数据写入以文本模式打开的文件对象（不含[#NNNN]块头）
+        _formatted：(键,id(值)):已格式化的行，写入整个工程时由各音符共用，同一个值对象只格式化一次
+        '''
+        if(self._clean):
+            file.write(self._raw+"\n")
+            return
+        #必有数据Length、Lyric、Notenum
+        lines=["Length={}\nLyric={}\nNoteNum={}\n".format(self.length,self.lyric,self.notenum)]
+        formatters=_valueformatters
+        if(_formatted is None):
+            _formatted={}
+        pr=self.properties
+        for (key,value) in pr.items():
+            if(not key.startswith("_")):
+                k=(key,id(value))
+                line=_formatted.get(k)
+                if(line is None):
+                    line=_formatted[k]="{}={}\n".format(key,formatters.get(key,str)(value))
+                lines.append(line)
+        file.write("".join(lines))
+    
+    def isR(self)->bool:
+        '''
+        判断音符是否为休止符(“r”,“R”,“”,“ ”)
+        '''
+        return (self.lyric in [""," ","r","R"])
+
+    def to_music21_note(self):
+        '''
+        将UTAU音符对象转为music21音符对象
+        '''
+        import music21
+        if(self.isR()):
+            n=music21.note.Rest()
+        else:
+            n=music21.note.Note(self.notenum)
+            n.lyric=self.lyric
+        n.duration=music21.duration.Duration(self.length/480)
+        return n
+
+class _NoteList(list):
+    '''
+    Ustfile.note使用的音符列表，version记录列表被修改（增删、替换、重新排序）的次数，用于判断时间索引是否需要重建
+    '''
+    #类属性作为初始值，反序列化时append、extend可能先于实例属性被恢复
+    version=0
+
+def _modifies(name:str):
+    method=getattr(list,name)
+    def modified(self,*args,**kwargs):
+        self.version+=1
+        return method(self,*args,**kwargs)
+    modified.__name__=name
+    return modified
+
+for _name in ["__setitem__","__delitem__","__iadd__","__imul__","append","extend",
+              "insert","pop","remove","clear","sort","reverse"]:
+    setattr(_NoteList,_name,_modifies(_name))
+
+class Ustfile():
+    '''
+    ust文件类
+    note:音符，list
+    tempo:曲速，float
+    properties:工程整体属性(即[#SETTING]块),dict
+    properties中，以"_"开头的键被视为临时变量，不被写入UST文件
+    '''
+    def __init__(self,
+                 note:List[Ustnote]=[],
+                 tempo:float=120,
+                 properties:dict={}):
+        if(note==[]):
+            note=[]
+        if(properties=={}):
+            properties={}
+        self.tempo:float=tempo
+        self.properties:dict=properties
+        self.note:List[Ustnote]=note
+        #音符起点的前缀和索引，在音符列表或音符时长变化后重建
+        self._ticks:List[int]=None
+        self._ticksnote:List[Ustnote]=None
+        self._ticksversion:tuple=None
+
+    @property
+    def note(self)->List[Ustnote]:
+        return self._note
+
+    @note.setter
+    def note(self,note:List[Ustnote]):
+        #赋值的列表被复制为_NoteList，之后对self.note的修改都会被记录
+        if(type(note) is not _NoteList):
+            note=_NoteList(note)
+        self._note=note
+        
+    def __str__(self):
+        s=io.StringIO()
+        self.write(s)
+        return s.getvalue()
+
+    def write(self,file):
+        '''
+        将工程逐块写入以文本模式打开的文件对象（从[#SETTING]块开始）
+        '''
+        self._writesetting(file)
+        #写入期间所有值对象都被音符引用，id不会被重复使用
+        formatted={}
+        for i in range(0,len(self.note)):
+            file.write('[#{:0>4}]\n'.format(i))
+            self.note[i].write(file,formatted)
+        file.write("[#TRACKEND]\n")
+
+    def _writesetting(self,file):
+        '''
+        写入[#SETTING]块
+        '''
+        pro=self.properties
+        raw=pro.get("_rawsetting")
+        if(raw is not None and self._settingclean()):
+            file.write('[#SETTING]\n'+raw+"\n")
+        else:
+            formatters=_valueformatters
+            lines=['[#SETTING]\n',"Tempo={}\n".format(self.tempo)]
+            for i in pro.keys():
+                if(not i.startswith("_")):
+                    lines.append("{}={}\n".format(i,formatters.get(i,str)(pro[i])))
+            file.write("".join(lines))
+
+    def _settingclean(self)->bool:
+        '''
+        判断[#SETTING]块与打开文件时的原文是否一致
+        '''
+        pro={i:j for (i,j) in self.properties.items() if not i.startswith("_")}
+        pro["Tempo"]=self.tempo
+        return _parseustblock(self.properties["_rawsetting"].split("\n"))==pro
+
+    def save(self,filename:str):
+        '''
+        保存UST文件，默认使用UTF-8编码
+        使用openust(keepraw=True)打开的文件，将沿用原文件的编码、换行符与[#VERSION]块，并原样写出未被修改的块
+        如果修改后的内容无法用原文件的编码保存，则改为UTF-8编码
+        '''
+        encoding=self.properties.get("_encoding") or "utf-8"
+        try:
+            self._save(filename,encoding)
+        except UnicodeEncodeError:
+            if(encoding=="utf-8"):
+                raise
+            self._save(filename,"utf-8")
+
+    def _save(self,filename:str,encoding:str):
+        raw=self.properties.get("_rawversion")
+        if(raw is None):
+            header="UST Version1.2\nCharset=UTF-8" if encoding=="utf-8" else "UST Version1.2"
+        elif(encoding=="utf-8" and "Charset=UTF-8" not in raw):
+            header=raw+"\nCharset=UTF-8"
+        else:
+            header=raw
+        with open(filename,"w",encoding=encoding,buffering=1<<16,newline=self.properties.get("_newline")) as file:
+            file.write("[#VERSION]\n"+header+"\n")
+            self.write(file)
+        
+    def getlyric(self,start:int=0,end:int=0,ignoreR:bool=True)->list:
+        '''
+        获取歌词,返回歌词列表
+        start：指定获取歌词区间的起点
+        end：指定获取歌词区间的终点
+        ignoreR：忽略休止符
+        '''
+        if(end==0):
+            end=len(self.note)
+        lyric=[]
+        if(ignoreR):
+            for i in self.note[start:end]:
+                if(not i.isR()):
+                    lyric+=[i.lyric]
+        else:
+            for i in self.note[start:end]:
+                lyric+=[i.lyric]
+        return lyric
+    
+    def replacelyric(self,dictionary:Dict[str,str],start:int=0,end:int=0):
+        '''
+        按字典替换歌词
+        start：指定替换歌词区间的起点
+        end：指定替换歌词区间的终点
+        '''
+        if(end==0):
+            end=len(self.note)
+        for i in range(0,len(self.note))[start:end]:
+            self.note[i].lyric=dictionary.get(self.note[i].lyric,self.note[i].lyric)
+        return self
+    
+    def transliterate(self,table,start:int=0,end:int=0):
+        '''
+        用转换器转换歌词，可以转换多音节歌词（如"kakiku"）、VCV歌词（如"a ka"）和带前后缀的歌词
+        table：utaufile.dictionary.compile_dictionary()生成的转换器，也可以直接使用字典（每次调用都会重新编译）
+        start：指定转换歌词区间的起点
+        end：指定转换歌词区间的终点
+        '''
+        from .dictionary import Transliterator
+        if(not isinstance(table,Transliterator)):
+            table=Transliterator(table)
+        if(end==0):
+            end=len(self.note)
+        for note in self.note[start:end]:
+            lyric=table(note.lyric)
+            if(lyric!=note.lyric):
+                note.lyric=lyric
+        return self
+
+    def setlyric(self,lyrics:list,start:int=0,end:int=0,ignoreR:bool=True):
+        '''
+        批量输入歌词
+        lyrics:输入歌词列表
+        start：指定输入歌词区间的起点
+        end：指定输入歌词区间的终点
+        ignoreR：忽略休止符
+        如果输入歌词列表的长度大于输入歌词区间的有效音符数，则多出的歌词将不会被使用
+        如果输入歌词列表的长度小于输入歌词区间的有效音符数，则多出的音符歌词不变
+        '''
+        if(end==0):
+            end=len(self.note)
+        if(ignoreR):
+            j=0
+            l=len(lyrics)
+            for i in range(0,len(self.note))[start:end]:
+                if(not self.note[i].isR()):
+                    if(j>=l):
+                        break
+                    self.note[i].lyric=lyrics[j]
+                    j=j+1
+        else:
+            j=0
+            l=len(lyrics)
+            for i in range(0,len(self.note))[start:end]:
+                if(j>=l):
+                    break
+                self.note[i].lyric=lyrics[j]
+                j=j+1
+        return self
+    
+    def nrange(self)->tuple:
+        '''
+        获取ust工程的音域
+        返回元组：(最低音,最高音+1)
+        '''
+        notenums=[i.notenum for i in self.note if (not i.isR())]
+        return (min(notenums),max(notenums)+1)
+    
+    def length(self)->int:
+        '''
+        获取ust工程的总长度
+        '''
+        return sum([i.length for i in self.note])
+    
+    def quantize(self,d:int):
+        '''
+        将UST工程按照给定的分度值（四分音符为480）量化。
+        将所有音符的边界四舍五入到d的整数倍，过短的音符将被删除。
+        例如，如果需要量化到八分音符，请使用f.quantize(240)
+        '''
+        note_new=[]
+        tick=0
+        for i in self.note:
+            tick_c=int(round((tick+i.length)/d))*d
+            i.length=tick_c-tick
+            if(i.length>0):
+                note_new+=[i]
+            tick=tick_c
+        self.note=note_new
+        return self
+        
+    def transpose(self,n:int):
+        """
+        对utau工程移调
+        n：移调半音数，向上为正，向下为负。
+        """
+        for note in self.note:
+            note.notenum+=n
+        return self
+
+    def _tickindex(self)->List[int]:
+        '''
+        返回各音符起点组成的列表，最后一项为工程总长度
+        音符列表被替换或修改（增删、替换、重新排序），或任何音符的length被修改时自动重建
+        '''
+        note=self.note
+        version=(note.version,_lengthversion)
+        if(self._ticksnote is not note or self._ticksversion!=version):
+            self._ticks=[0]+list(itertools.accumulate(i.length for i in note))
+            self._ticksnote=note
+            self._ticksversion=version
+        return self._ticks
+
+    def reindex(self):
+        '''
+        强制重建音符时间索引，索引总是自动重建，通常不需要调用
+        '''
+        self._ticksnote=None
+        return self
+
+    def start_tick(self,i:int)->int:
+        '''
+        获取第i个音符的起点（480为一拍）
+        i等于音符数时，返回工程总长度
+        '''
+        return self._tickindex()[i]
+
+    def note_at(self,tick:int):
+        '''
+        获取tick时刻（480为一拍）所在音符的序号，tick不在工程范围内时返回None
+        '''
+        ticks=self._tickindex()
+        i=bisect.bisect_right(ticks,tick)-1
+        if(0<=i<len(self.note)):
+            return i
+        return None
+
+    def notes_between(self,t0:int,t1:int)->range:
+        '''
+        获取与时间区间[t0,t1)（480为一拍）重叠的所有音符的序号，返回range
+        '''
+        ticks=self._tickindex()
+        first=max(bisect.bisect_right(ticks,t0)-1,0)
+        last=min(bisect.bisect_left(ticks,t1),len(self.note))
+        return range(first,max(last,first))
+
+    def tempomap(self):
+        '''
+        由工程曲速与音符properties中的"Tempo"生成曲速表（utaufile.timeline.TempoMap，需要numpy）
+        用于时刻（480为一拍）与绝对时间（毫秒）的换算
+        '''
+        from .timeline import TempoMap
+        ticks=[0]
+        tempo=[self.tempo]
+        tick=0
+        for note in self.note:
+            #未解析的音符只在原文中含有Tempo时才解析
+            if(note._properties is not None or "Tempo=" in note._raw):
+                t=note._getproperties().get("Tempo")
+                if(t is not None and t!=tempo[-1]):
+                    if(tick==ticks[-1]):
+                        tempo[-1]=t
+                    else:
+                        ticks.append(tick)
+                        tempo.append(t)
+            tick+=note.length
+        return TempoMap(ticks,tempo)
+
+    def flag_table(self,preset:set=flag.moresampler):
+        '''
+        将所有音符的Flags解析为numpy结构化数组（需要numpy）
+        每行为一个音符，每列为预设中的一个flag，音符中没有的flag取预设中的默认值
+        preset：flag预设，可参考utaufile.flag库
+        例：将C5以上所有音符的g设为-5
+            table=f.flag_table()
+            table["g"][np.array([n.notenum for n in f.note])>=72]=-5
+            f.apply_flag_table(table)
+        '''
+        import numpy as np
+        parser=flag.compile_flags(preset)
+        dtype=[]
+        for name in sorted(parser.defaults):
+            default=parser.defaults[name]
+            if(type(default)==bool):
+                dtype.append((name,bool))
+            elif(type(default)==int):
+                dtype.append((name,np.int64))
+            else:
+                dtype.append((name,object))
+        #相同的flag字符串只解析一次，再按每个音符的序号展开
+        index={}
+        inverse=[index.setdefault(i._getproperties().get("Flags",""),len(index)) for i in self.note]
+        unique=[tuple([i[name] for (name,t) in dtype]) for i in parser.parse_many(index,usedefault=True)]
+        return np.array(unique,dtype=dtype)[np.array(inverse,dtype=np.int64)]
+
+    def apply_flag_table(self,table,preset:set=flag.moresampler):
+        '''
+        将flag_table()生成（并修改过）的结构化数组写回各音符的Flags
+        只有flag发生变化的音符会被修改，取默认值的flag不会被写出
+        原有的flag保持原来的顺序，预设中没有的flag原样保留
+        '''
+        if(len(table)!=len(self.note)):
+            raise ValueError("flag table has {} rows but the project has {} notes".format(len(table),len(self.note)))
+        parser=flag.compile_flags(preset)
+        names=table.dtype.names
+        #先生成所有音符的新flag，任一音符无法改写时不修改工程
+        changed=[]
+        for (note,row) in zip(self.note,table.tolist()):
+            old=note._getproperties().get("Flags","")
+            current=parser.parse(old,usedefault=True)
+            new=dict(zip(names,row))
+            if(all(current[i]==new[i] for i in names)):
+                continue
+            changed.append((note,parser.rewrite(old,{i:new[i] for i in names if current[i]!=new[i]})))
+        for (note,flags) in changed:
+            if(flags==""):
+                note.properties.pop("Flags",None)
+            else:
+                note.properties["Flags"]=flags
+        return self
+
+    def to_arrays(self):
+        '''
+        将ust文件对象转换为列式表示UstArrays，用于对大量音符的向量化分析与编辑（需要numpy）
+        '''
+        from .arrays import UstArrays
+        lyricid={}
+        lyric=[lyricid.setdefault(i.lyric,len(lyricid)) for i in self.note]
+        return UstArrays(length=[i.length for i in self.note],
+                         notenum=[i.notenum for i in self.note],
+                         lyric=lyric,
+                         lyrics=list(lyricid),
+                         properties=[i._getproperties().copy() for i in self.note],
+                         tempo=self.tempo,
+                         fileproperties=self.properties.copy())
+
+    def to_midi_track(self):
+        '''
+        将ust文件对象转换为mido.MidiTrack对象
+        '''
+        import mido
+        track=mido.MidiTrack()
+        tick=0
+        for note in self.note:
+            if(note.isR()):
+                tick+=note.length
+            else:
+                track.append(mido.MetaMessage('lyrics',text=note.lyric,time=tick))
+                tick=0
+                track.append(mido.Message('note_on', note=note.notenum,velocity=64,time=0))
+                track.append(mido.Message('note_off',note=note.notenum,velocity=64,time=note.length))
+        track.append(mido.MetaMessage('end_of_track'))
+        return(track)
+    
+    def to_midi_file(self,filename:str=""):
+        '''
+        将ust文件对象转换为mid文件和mido.MidiFile对象
+        音符的曲速变化写为多个set_tempo事件
+        '''
+        import mido
+        mid = mido.MidiFile()
+        ctrltrack=mido.MidiTrack()
+        ctrltrack.append(mido.MetaMessage('track_name',name='Control',time=0))
+        last=0
+        for (tick,tempo) in self.tempomap().changes():
+            ctrltrack.append(mido.MetaMessage('set_tempo',tempo=mido.bpm2tempo(tempo),time=tick-last))
+            last=tick
+        mid.tracks.append(ctrltrack)
+        mid.tracks.append(self.to_midi_track())
+        if(filename!=""):
+            mid.save(filename)
+        return mid
+    
+    def to_nn_file(self):
+        '''
+        将ust文件对象转换为nn文件对象
+        nn文件只有一个曲速，有曲速变化时，音符位置按绝对时间换算为工程曲速下的时刻
+        '''
+        from .nn import Nnfile,Nnnote
+        nn=Nnfile(tempo=self.tempo)
+        ticks=self._tickindex()
+        tempomap=self.tempomap()
+        if((tempomap.tempo!=self.tempo).any()):
+            ticks=(tempomap.ticks_to_ms(ticks)*(self.tempo*480/60000)).round().astype(int).tolist()
+        for (n,i) in enumerate(self.note):
+            if(not i.isR()):
+                starttime=ticks[n]
+                time=ticks[n+1]
+                nn.note+=[Nnnote(hanzi=i.lyric,
+                                pinyin=i.lyric,
+                                start=starttime//60,
+                                length=time//60-starttime//60,
+                                notenum=i.notenum)]
+        return nn
+
+    def to_music21_stream(self):
+        '''
+        将ust文件对象转换为music21 stream，并自动判断调性
+        '''
+        #其他文件转music21 stream，将一律先转UST，再转music21 stream
+        #因为UST将音轨描述为音符和休止符组成，这与music21不谋而合
+        import music21
+        st=music21.stream.Stream()
+        for n in self.note:
+            st.append(n.to_music21_note())
+        try:
+            k=st.analyze("key")
+        except music21.analysis.discrete.DiscreteAnalysisException:
+            k=music21.key.Key('C')
+        st.insert(0,k)
+        ks=st.keySignature
+        #消除还原符号，把音高数值嵌入到调性中。
+        pitchdict={p.pitchClass:p.name for p in ks.getPitches()}
+        for n in st.notes:
+            m=n.pitch.midi
+            n.name=pitchdict.get(n.pitch.pitchClass,n.name)
+            n.octave+=(m-n.pitch.midi)//12
+        #曲速
+        if(self.tempo>0):
+            st.insert(music21.tempo.MetronomeMark(number=self.tempo))
+        return st
+
+    def to_dv_segment(self):
+        '''
+        将ust文件对象转换为dv区段对象
+        '''
+        import dvfile
+        ticks=self._tickindex()
+        dvnotes=[]
+        for (n,i) in enumerate(self.note):
+            if(not i.isR()):
+                dvnotes.append(dvfile.Dvnote(hanzi=i.lyric,
+                                pinyin=i.lyric,
+                                start=ticks[n],
+                                length=i.length,
+                                notenum=i.notenum))
+        return dvfile.Dvsegment(start=1920,
+                                length=ticks[-1],
+                                note=dvnotes)
+
+    def to_dv_track(self):
+        '''
+        将ust文件对象转换为dv音轨对象
+        '''
+        import dvfile
+        return dvfile.Dvtrack(segment=[self.to_dv_segment()])
+
+    def to_dv_file(self):
+        '''
+        将ust文件对象转换为dv文件对象
+        '''
+        import dvfile
+        #区段从第1920刻开始
+        changes=self.tempomap().changes()
+        tempo=[(0,changes[0][1])]+[(tick+1920,t) for (tick,t) in changes[1:]]
+        return dvfile.Dvfile(tempo=tempo,
+                             beats=[(-3,4,4)],
+                             track=[self.to_dv_track()])
+
+def _str2bool(value:str)->bool:
+    return {"True":True,"true":True,"False":False,"false":False}[value]
+
+def _str2number(value:str):
+    '''
+    将字符串转换为int或float，无法转换的（如Envelope中的"%"、空字符串）保持原样
+    '''
+    try:
+        return int(value)
+    except ValueError:
+        try:
+            return float(value)
+        except ValueError:
+            return value
+
+def _str2numbers(value:str)->tuple:
+    '''
+    将逗号分隔的数列（如Envelope、PBW、VBR）转换为元组
+    '''
+    return tuple([_str2number(i) for i in value.split(",")])
+
+def _numbers2str(value)->str:
+    return ",".join([str(i) for i in value])
+
+def _str2pbs(value:str)->tuple:
+    '''
+    PBS的格式为"时间;音高"，音高可省略
+    '''
+    return tuple([_str2number(i) for i in value.replace(",",";").split(";")])
+
+def _pbs2str(value)->str:
+    return ";".join([str(i) for i in value])
+
+#ust中各键的值的类型，键:(由字符串转换为值的函数,由值转换为字符串的函数)
+#未列出的键，值保持为字符串
+_valueparsers={}
+_valueformatters={}
+#"键=值"行:(键,值)，相同的行只解析一次，解析结果为不可变的值时由各音符共享
+_parsedlines={}
+_parsedlimit=1<<16
+
+def registervaluetype(key:str,parser,formatter=str):
+    '''
+    注册ust中某个键的值的类型，解析与保存ust文件时使用
+    key：键名，例如"PreUtterance"
+    parser：由ust中的字符串转换为值的函数
+    formatter：由值转换为ust中的字符串的函数，默认为str
+    例如：utaufile.registervaluetype("MyFlag",int)
+    '''
+    _valueparsers[key]=parser
+    _valueformatters[key]=formatter
+    _parsedlines.clear()
+
+for (key,parser,formatter) in [
+        ("Length",int,str),
+        ("NoteNum",int,str),
+        ("Tempo",float,str),
+        ("Tracks",int,str),
+        ("Mode2",_str2bool,str),
+        ("PreUtterance",float,str),
+        ("VoiceOverlap",int,str),
+        ("Velocity",int,str),
+        ("Intensity",int,str),
+        ("Modulation",int,str),
+        ("$direct",_str2bool,str),
+        ("Envelope",_str2numbers,_numbers2str),
+        ("PBW",_str2numbers,_numbers2str),
+        ("PBY",_str2numbers,_numbers2str),
+        ("PBS",_str2pbs,_pbs2str),
+        ("VBR",_str2numbers,_numbers2str),
+        ("Pitches",_str2numbers,_numbers2str),
+        ("Piches",_str2numbers,_numbers2str)]:
+    registervaluetype(key,parser,formatter)
+
+def ustvaluetyper(key,value):#根据ust中的键决定值的类型
+    return _valueparsers.get(key,str)(value)
+
+def ustvaluestr(key,value)->str:
+    '''
+    将值转换为ust中的字符串，ustvaluetyper的逆操作
+    '''
+    return _valueformatters.get(key,str)(value)
+
+def _parseustblock(lines)->dict:
+    '''
+    解析ust块中的"键=值"行，返回属性字典（值为空的键被忽略）
+    '''
+    properties={}
+    parsers=_valueparsers
+    parsed=_parsedlines
+    for line in lines:
+        item=parsed.get(line)
+        if(item is None):
+            if("=" not in line):
+                continue
+            [key,value]=line.split("=",1)
+            if(value==""):
+                continue
+            #键名驻留，所有音符共享同一个字符串对象
+            key=sys.intern(key)
+            item=(key,parsers.get(key,str)(value))
+            if(type(item[1]) in (tuple,str,int,float,bool)):
+                if(len(parsed)>=_parsedlimit):
+                    parsed.clear()
+                parsed[line]=item
+        properties[item[0]]=item[1]
+    return properties
+
+def _decodeline(line:bytes,encoding:str)->str:
+    '''
+    尝试用各种编码解码一行，全部失败则只保留换行符
+    '''
+    content=line.rstrip(b"\r\n")
+    for i in [encoding,"gbk","utf-8","shift-JIS"]:
+        try:
+            return str(content,encoding=i)+str(line[len(content):],encoding="ascii")
+        except UnicodeDecodeError:
+            pass
+    return str(line[len(content):],encoding="ascii")
+
+def decodeust(data:bytes,encoding:str,fallbacklines:list=None,firstline:int=1)->str:
+    '''
+    解码ust文件内容
+    首先尝试整体一次解码，只有解码失败的行才逐行尝试其他编码(gbk,utf-8,shift-JIS)
+    fallbacklines：如果不为None，需要逐行解码的行号将被添加到该列表中
+    firstline：data第一行的行号，默认从1开始
+    '''
+    try:
+        return str(data,encoding=encoding)
+    except UnicodeDecodeError:
+        pass
+    view=memoryview(data)
+    parts=[]
+    pos=0
+    lineno=firstline
+    while(True):
+        try:
+            parts.append(str(view[pos:],encoding=encoding))
+            break
+        except UnicodeDecodeError as e:
+            bad=pos+e.start
+        #出错位置之前的完整行仍然整体解码
+        linestart=max(data.rfind(b"\n",pos,bad)+1,pos)
+        lineend=data.find(b"\n",bad)
+        if(lineend==-1):
+            lineend=len(data)
+        else:
+            lineend+=1
+        parts.append(str(view[pos:linestart],encoding=encoding))
+        lineno+=data.count(b"\n",pos,linestart)
+        parts.append(_decodeline(data[linestart:lineend],encoding))
+        if(fallbacklines is not None):
+            fallbacklines.append(lineno)
+        lineno+=1
+        pos=lineend
+    return "".join(parts)
+
+def _iterustblocks(file,fallbacklines:list=None,chunksize:int=1<<22,info:dict=None):
+    '''
+    逐块读取二进制模式打开的ust文件，产生(块名,解码后的行列表)，块名例如"#SETTING"、"#0001"
+    文件按chunksize字节分段整体解码
+    info：如果不为None，文件使用的换行符、编码将被保存在info["newline"]、info["encoding"]中
+    '''
+    encoding=None
+    rest=b""
+    lineno=1
+    name=None
+    block=[]
+    while(True):
+        chunk=file.read(chunksize)
+        #读取编码
+        if(encoding is None):
+            if(b"Charset=UTF-8" in chunk):
+                encoding="utf-8"
+            else:
+                encoding="shift-JIS"
+            if(info is not None):
+                info["encoding"]=encoding
+                if(b"\r\n" in chunk):
+                    info["newline"]="\r\n"
+                else:
+                    info["newline"]="\n"
+        #只解码到最后一个完整的行
+        if(chunk==b""):
+            (data,rest)=(rest,b"")
+        else:
+            data=rest+chunk
+            cut=data.rfind(b"\n")+1
+            (data,rest)=(data[:cut],data[cut:])
+        text=decodeust(data,encoding,fallbacklines,lineno)
+        lineno+=data.count(b"\n")
+        lines=text.split("\n")
+        if(lines[-1]==""):
+            lines.pop()
+        for linestr in lines:
+            linestr=linestr.strip("\r")
+            if(linestr.startswith("[")):
+                if(name is not None):
+                    yield (name,block)
+                name=linestr.strip("[]")
+                block=[]
+            else:
+                block.append(linestr)
+        if(chunk==b""):
+            break
+    if(name is not None):
+        yield (name,block)
+
+def _lazyustnote(block:List[str],keepraw:bool=False)->Ustnote:
+    '''
+    只解析Length、Lyric、NoteNum，其他属性以原文保存，在第一次访问properties时解析
+    keepraw：如果为True，在音符被修改前，保存时原样写出原文
+    '''
+    core={}
+    for line in block:
+        if(line.startswith(("Length=","Lyric=","NoteNum="))):
+            [key,value]=line.split("=",1)
+            if(value!=""):
+                core[key]=value
+    note=Ustnote(length=int(core["Length"]),
+                 lyric=core["Lyric"],
+                 notenum=int(core["NoteNum"]))
+    note._properties=None
+    note._raw="\n".join(block)
+    note._clean=keepraw
+    return note
+
+def _newustnotes(columns)->List[Ustnote]:
+    '''
+    批量创建音符，不经过各属性的setter，用于从缓存、存档中大量恢复音符
+    columns：由(length,lyric,notenum,properties)组成的可迭代对象
+    '''
+    new=Ustnote.__new__
+    notes=[]
+    for (length,lyric,notenum,properties) in columns:
+        note=new(Ustnote)
+        note._length=length
+        note._lyric=lyric
+        note._notenum=notenum
+        note._properties=properties
+        note._raw=None
+        note._clean=False
+        notes.append(note)
+    return notes
+
+def iterust(file,fallbacklines:list=None,lazy:bool=False,keepraw:bool=False):
+    '''
+    逐块读取ust文件的生成器，不将整个文件读入内存
+    file：文件名，或以二进制模式打开的文件对象
+    fallbacklines：如果不为None，编码与文件其他部分不同、需要逐行解码的行号将被添加到该列表中
+    lazy：如果为True，音符只解析Length、Lyric、NoteNum，properties在第一次访问时才被解析
+    keepraw：如果为True，保存各块的原文，未被修改的块在保存时原样写出，包含lazy的效果
+    首先产生工程整体属性字典(即[#SETTING]块，包括Tempo)，之后每读到一个音符块，产生一个Ustnote对象
+    文件中既没有[#SETTING]块也没有音符块时抛出ValueError
+    '''
+    if(isinstance(file,(str,os.PathLike))):
+        with open(file,'rb') as f:
+            yield from iterust(f,fallbacklines,lazy,keepraw)
+        return
+    settingdone=False
+    info={}
+    rawversion=None
+    def setting(block):
+        '''
+        生成工程整体属性字典，keepraw时记录[#VERSION]、[#SETTING]块的原文、换行符与编码，保存时沿用
+        '''
+        fileproperties={} if block is None else _parseustblock(block)
+        if(keepraw):
+            if(block is not None):
+                fileproperties["_rawsetting"]="\n".join(block)
+            if(rawversion is not None):
+                fileproperties["_rawversion"]=rawversion
+            fileproperties["_newline"]=info.get("newline")
+            fileproperties["_encoding"]=info.get("encoding")
+        return fileproperties
+    for (name,block) in _iterustblocks(file,fallbacklines,info=info):
+        if(name=="#VERSION"):
+            rawversion="\n".join(block)
+        elif(name=="#SETTING"):
+            if(not settingdone):
+                settingdone=True
+                yield setting(block)
+        elif(name=="#TRACKEND"):
+            break
+        elif(name[1:].isdigit() or name=="#INSERT"):
+            #[#PREV]、[#NEXT]、[#DELETE]只出现在插件临时文件中，见utaufile.plugin
+            if(not settingdone):
+                settingdone=True
+                yield setting(None)
+            if(lazy or keepraw):
+                yield _lazyustnote(block,keepraw)
+                continue
+            noteproperties=_parseustblock(block)
+            length=noteproperties.pop("Length")
+            notenum=noteproperties.pop("NoteNum")
+            lyric=noteproperties.pop("Lyric")
+            yield Ustnote(length=length,
+                          lyric=lyric,
+                          notenum=notenum,
+                          properties=noteproperties)
+    if(not settingdone):
+        raise ValueError("not a ust file: no [#SETTING] or note blocks found")
+
+def openust(filename:str,lazy:bool=False,keepraw:bool=False):
+    '''
+    打开ust文件，返回Ustfile对象
+    filename：文件名，或以二进制模式打开的文件对象
+    lazy：如果为True，音符的properties在第一次访问时才被解析，适用于只读取歌词、音高、时长的场合
+    keepraw：如果为True，保存各块的原文，保存时未被修改的块原样写出，使修改前后的文件差异最小
+    如果有编码与文件其他部分不同的行，其行号列表保存在properties["_fallbacklines"]中
+    '''
+    fallbacklines=[]
+    reader=iterust(filename,fallbacklines,lazy,keepraw)
+    fileproperties=next(reader)
+    tempo=fileproperties.pop("Tempo",120.0)
+    note=list(reader)
+    if(fallbacklines!=[]):
+        fileproperties["_fallbacklines"]=fallbacklines
+    return Ustfile(properties=fileproperties,
+                   note=note,
+                   tempo=tempo)